@@ -0,0 +1,379 @@
+import asyncio
+import csv
+import logging
+import ssl
+import time
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+from fetch import (
+    CHECKPOINT_FILE,
+    CSV_HEADER,
+    DEFAULT_BASE_URL,
+    EXIT_FILE_ERROR,
+    EXIT_NO_ELEMENT,
+    EXIT_TIMEOUT,
+    EXIT_UNKNOWN_ERROR,
+    ALIASES_FILE,
+    FAILURE_LEDGER_FILE,
+    HTTP_USER_AGENT,
+    READY_TIMEOUT,
+    CrawlJournal,
+    StoreLookupError,
+    cleanup_resources,
+    extract_badge,
+    canonical_store_name,
+    load_stores,
+    parse_badge_text,
+    percentile,
+    prepare_store_list,
+    setup_logging,
+    store_key,
+)
+
+class TokenBucket:
+    """Allow `rate` requests per second on average, with bursts of up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so tokens are handed out first come, first served
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class ConnectionPool:
+    """Idle keep-alive connections per (scheme, host, port)"""
+
+    def __init__(self):
+        self.idle = {}
+        self.ssl_context = ssl.create_default_context()
+
+    async def acquire(self, scheme, host, port):
+        """Return (reader, writer, reused)"""
+        connections = self.idle.get((scheme, host, port))
+        while connections:
+            reader, writer = connections.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+
+        reader, writer = await asyncio.open_connection(
+            host, port,
+            ssl=self.ssl_context if scheme == 'https' else None,
+            server_hostname=host if scheme == 'https' else None
+        )
+        return reader, writer, False
+
+    def release(self, scheme, host, port, reader, writer):
+        self.idle.setdefault((scheme, host, port), []).append((reader, writer))
+
+    async def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+                try:
+                    await writer.wait_closed()
+                except (ConnectionError, ssl.SSLError):
+                    pass
+        self.idle.clear()
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response; return (status, headers, body, keep_alive)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed before response")
+    version, status = status_line.decode('latin-1').split(' ', 2)[:2]
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+    if 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding', '').lower() == 'chunked':
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+        body = b''.join(chunks)
+    else:
+        body = await reader.read()
+        keep_alive = False
+
+    return int(status), headers, body, keep_alive
+
+class AsyncHttpClient:
+    """Minimal keep-alive HTTP/1.1 GET client with a per-host token bucket"""
+
+    def __init__(self, rate, burst):
+        self.pool = ConnectionPool()
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+
+    async def throttle(self, url):
+        """Wait for a request token for the url's host; returns at once without a rate limit"""
+        if not self.rate:
+            return
+        host = urlsplit(url).hostname
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(self.rate, self.burst)
+        await self.buckets[host].acquire()
+
+    async def get(self, url):
+        """Send one GET; callers throttle() first so rate limiting is not counted as request time"""
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        host = parts.hostname
+        port = parts.port or (443 if scheme == 'https' else 80)
+        path = quote(parts.path or '/', safe='/%')
+        if parts.query:
+            path += '?' + parts.query
+
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {parts.netloc}\r\n"
+            f"User-Agent: {HTTP_USER_AGENT}\r\n"
+            "Accept: application/json, text/html\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode('latin-1')
+
+        # A pooled connection may have been closed by the server; retry once on a fresh one
+        while True:
+            reader, writer, reused = await self.pool.acquire(scheme, host, port)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status, headers, body, keep_alive = await read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+
+            if keep_alive:
+                self.pool.release(scheme, host, port, reader, writer)
+            else:
+                writer.close()
+            return status, headers.get('content-type', ''), body
+
+    async def close(self):
+        await self.pool.close()
+
+class CrawlStats:
+    """Throughput and latency figures for a crawl"""
+
+    def __init__(self):
+        self.latencies = []
+        self.failures = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    def record(self, latency):
+        self.latencies.append(latency)
+
+    def stop(self):
+        self.finished = time.monotonic()
+
+    def percentile(self, pct):
+        """Nearest-rank percentile of the recorded latencies, in seconds"""
+        return percentile(self.latencies, pct)
+
+    def summary(self):
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            'stores': len(self.latencies),
+            'failures': self.failures,
+            'elapsed_s': round(elapsed, 2),
+            'stores_per_s': round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            'p50_s': round(self.percentile(50), 3),
+            'p95_s': round(self.percentile(95), 3),
+            'p99_s': round(self.percentile(99), 3)
+        }
+
+async def lookup_store(client, store, base_url):
+    """Fetch one merchant page; return its CSV row and the seconds the request took"""
+    formatted_store = canonical_store_name(store)
+    url = base_url + formatted_store
+
+    # Waiting for a rate limit token is not part of the request, so it counts neither
+    # towards READY_TIMEOUT nor towards the recorded latency
+    await client.throttle(url)
+    start_time = time.time()
+    request_start = time.monotonic()
+    try:
+        status, content_type, body = await asyncio.wait_for(client.get(url), READY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise StoreLookupError(f"Timeout waiting for element on {formatted_store}", EXIT_TIMEOUT)
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        raise StoreLookupError(f"Error processing {formatted_store}: {str(e)}", EXIT_UNKNOWN_ERROR)
+    latency = time.monotonic() - request_start
+    ready_time = round(time.time() - start_time, 2)
+
+    if status == 404:
+        raise StoreLookupError(f"HTTP {status} for: {formatted_store}", EXIT_NO_ELEMENT)
+    if status != 200:
+        raise StoreLookupError(f"HTTP {status} for: {formatted_store}", EXIT_UNKNOWN_ERROR)
+
+    try:
+        full_text = extract_badge(content_type, body)
+        if not full_text:
+            raise StoreLookupError(f"No element found for: {formatted_store}", EXIT_NO_ELEMENT)
+
+        mcc, merchant_type = parse_badge_text(full_text)
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        processing_time = round(time.time() - start_time, 2)
+        return [formatted_store, mcc, merchant_type, current_time, processing_time, ready_time], latency
+    except StoreLookupError:
+        raise
+    except Exception as e:
+        # A malformed body fails this store like in scrape_store(), instead of the whole gather()
+        raise StoreLookupError(f"Error processing {formatted_store}: {str(e)}", EXIT_UNKNOWN_ERROR)
+
+async def lookup_with_retries(client, store, base_url, max_retries, retry_backoff):
+    """Retry transient lookup failures with exponential backoff; returns (row, latency of the last attempt)"""
+    for attempt in range(1, max_retries + 2):
+        try:
+            return await lookup_store(client, store, base_url)
+        except StoreLookupError as e:
+            e.attempts = attempt
+            if attempt > max_retries or not e.retryable:
+                raise
+            delay = retry_backoff * 2 ** (attempt - 1)
+            logging.warning(f"{e} (attempt {attempt} of {max_retries + 1}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def crawl(stores, csv_writer, checkpoint, failure_ledger, base_url, concurrency, rate, burst,
+                max_retries, retry_backoff, row_sink=None):
+    """Look up every store, writing rows to the CSV in completion order"""
+    client = AsyncHttpClient(rate, burst)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = CrawlStats()
+    total_stores = len(stores)
+
+    async def run_one(store):
+        async with semaphore:
+            try:
+                row, latency = await lookup_with_retries(client, store, base_url, max_retries, retry_backoff)
+            except StoreLookupError as e:
+                stats.failures += 1
+                logging.error(f"Giving up on {store} after {e.attempts} attempt(s): {e}")
+                failure_ledger.record({
+                    'store': store,
+                    'error': str(e),
+                    'exit_code': e.exit_code,
+                    'attempts': e.attempts,
+                    'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                })
+                return e
+            stats.record(latency)
+
+            csv_writer.writerow(row)
+            checkpoint.record({'store': store, 'row': row})
+            if row_sink:
+                row_sink(row)
+            done = len(stats.latencies) + stats.failures
+            logging.info(f"Processed {done} of {total_stores}: {row[0]} -> {row[1]} ({row[2]})")
+            return None
+
+    try:
+        errors = await asyncio.gather(*(run_one(store) for store in stores))
+    finally:
+        await client.close()
+        stats.stop()
+
+    return stats, [error for error in errors if error]
+
+def fetch_merchant_data_async(stores_file='stores.json', base_url=DEFAULT_BASE_URL,
+                              concurrency=16, rate=10.0, burst=10,
+                              checkpoint_file=CHECKPOINT_FILE, failure_file=FAILURE_LEDGER_FILE,
+                              resume=False, max_retries=3, retry_backoff=2.0, aliases_file=ALIASES_FILE,
+                              row_sink=None, csv_filename=None):
+    """Crawl merchants on a single event loop instead of a pool of threads"""
+    log_filename = setup_logging()
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_filename = csv_filename or f'merchant_data_{timestamp}.csv'
+
+    try:
+        logging.info(f"Reading {stores_file} file...")
+        stores = prepare_store_list(load_stores(stores_file), aliases_file, f'merchant_aliases_{timestamp}.json')
+    except Exception as e:
+        cleanup_resources(temp_files=[log_filename],
+                          error_message=f"Failed to read {stores_file}: {str(e)}",
+                          exit_code=EXIT_FILE_ERROR)
+
+    completed = {}
+    if resume:
+        for entry in CrawlJournal.load(checkpoint_file):
+            completed[store_key(entry['store'])] = entry['row']
+        logging.info(f"Resuming: {len(completed)} stores already done in {checkpoint_file}")
+    todo = [store for store in stores if store_key(store) not in completed]
+
+    checkpoint = CrawlJournal(checkpoint_file, resume=resume)
+    failure_ledger = CrawlJournal(failure_file, resume=resume)
+
+    logging.info(f"Crawling {len(todo)} stores with concurrency {concurrency}, "
+                 f"{rate or 'unlimited'} requests/s per host")
+
+    with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(CSV_HEADER)
+        for store in stores:
+            if store_key(store) in completed:
+                row = completed.pop(store_key(store))
+                csv_writer.writerow(row)
+                if row_sink:
+                    row_sink(row)
+
+        try:
+            stats, failures = asyncio.run(crawl(
+                todo, csv_writer, checkpoint, failure_ledger, base_url,
+                concurrency, rate, burst, max_retries, retry_backoff, row_sink
+            ))
+        finally:
+            checkpoint.close()
+            failure_ledger.close()
+
+    summary = stats.summary()
+    logging.info(
+        f"\nProcessing complete! {summary['stores']} stores fetched, {summary['failures']} failed "
+        f"in {summary['elapsed_s']}s ({summary['stores_per_s']} stores/s)"
+    )
+    logging.info(f"Latency: p50 {summary['p50_s']}s, p95 {summary['p95_s']}s, p99 {summary['p99_s']}s")
+    logging.info(f"Data has been saved to {csv_filename}")
+    logging.info(f"Logs have been saved to {log_filename}")
+
+    if failures:
+        cleanup_resources(
+            error_message=f"{len(failures)} stores failed, see {failure_file}; rerun with --resume to retry them",
+            exit_code=failures[0].exit_code
+        )
+
+    return summary
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_heymax_server import synthetic_merchant_rows
+
+def synthetic_merchants(count, seed=42):
+    """Build a merchant frame shaped like process_merchant_data() output"""
+    import pandas as pd
+
+    rows = synthetic_merchant_rows(count, seed)
+    return pd.DataFrame(rows, columns=['Store', 'MCC', 'Type']).sort_values('Store')
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_child(count, mode):
+    """Build one PDF in this process and print its measurements as JSON"""
+    from merchant_pdf import create_merchant_pdf_enhanced
+
+    merchant_data = synthetic_merchants(count)
+    baseline_rss = peak_rss_mb()
+
+    with tempfile.TemporaryDirectory() as directory:
+        output_file = os.path.join(directory, 'bench.pdf')
+        start = time.perf_counter()
+        create_merchant_pdf_enhanced(merchant_data, output_file, False, streaming=(mode == 'streaming'))
+        wall_time = time.perf_counter() - start
+        size = os.path.getsize(output_file)
+
+    build_rss = peak_rss_mb() - baseline_rss
+    print(json.dumps({
+        'merchants': count,
+        'mode': mode,
+        'wall_time_s': round(wall_time, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_before_build_mb': round(baseline_rss, 1),
+        'build_rss_mb': round(build_rss, 1),
+        'build_rss_per_merchant_kb': round(build_rss * 1024 / count, 2),
+        'pdf_size_mb': round(size / (1024 * 1024), 2)
+    }))
+
+def check_fragment_cache(count):
+    """
+    Build with the fragment cache, then insert one merchant and delete another.
+
+    After each edit only the fragments whose rows hold the edit may be rendered
+    again; every other listing or guide fragment must come from the cache.
+    Returns the number of edits that re-rendered anything else.
+    """
+    import pandas as pd
+    from merchant_pdf import create_merchant_pdf_enhanced, load_build_manifest
+
+    merchant_data = synthetic_merchants(count).reset_index(drop=True)
+    position = count // 2
+    extra = pd.DataFrame([[merchant_data['Store'][position - 1] + ' Annex', '5999', 'Miscellaneous']],
+                         columns=merchant_data.columns)
+    inserted = pd.concat([merchant_data.iloc[:position], extra, merchant_data.iloc[position:]], ignore_index=True)
+    deleted = inserted.drop(index=count // 5).reset_index(drop=True)
+    edits = [('cold build', merchant_data, None), (f'insert at row {position}', inserted, position),
+             (f'delete row {count // 5}', deleted, count // 5)]
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        output_file = os.path.join(directory, 'bench.pdf')
+        cache_dir = os.path.join(directory, 'cache')
+        for label, frame, edited in edits:
+            start = time.perf_counter()
+            create_merchant_pdf_enhanced(frame, output_file, False, cache_dir=cache_dir)
+            elapsed = time.perf_counter() - start
+            manifest = load_build_manifest(cache_dir)
+            rendered = [(section, first, last) for section, first, last in manifest['rendered'] if section != 'front']
+            stray = [] if edited is None else [piece for piece in rendered if not piece[1] <= edited <= piece[2]]
+            print(f"{label:<20} rendered {len(rendered)} of {manifest['fragments'] - 1} listing and guide fragments "
+                  f"in {elapsed:.2f}s" + (f"  UNTOUCHED FRAGMENTS RE-RENDERED: {stray}" if stray else ""))
+            failures += bool(stray)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure PDF build time and peak memory")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--modes', nargs='+', choices=['streaming', 'list'], default=['streaming', 'list'])
+    parser.add_argument('--output', default='bench_pdf_results.json')
+    parser.add_argument('--cache-check', type=int, metavar='COUNT',
+                        help="Check that one insert and one delete among COUNT merchants only re-render "
+                             "the fragments they touch")
+    parser.add_argument('--child', nargs=2, metavar=('COUNT', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(int(args.child[0]), args.child[1])
+        return
+    if args.cache_check:
+        sys.exit(1 if check_fragment_cache(args.cache_check) else 0)
+
+    # Every measurement runs in a fresh interpreter so peak RSS is not shared between runs
+    results = []
+    for count in args.sizes:
+        for mode in args.modes:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', str(count), mode],
+                capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            )
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{count:>7} merchants  {mode:<9}  {result['wall_time_s']:>8.2f}s  "
+                  f"peak RSS {result['peak_rss_mb']:>8.1f} MB  build +{result['build_rss_mb']:>7.1f} MB "
+                  f"({result['build_rss_per_merchant_kb']:>6.2f} KB/merchant)  PDF {result['pdf_size_mb']:.2f} MB")
+
+    # Flat memory means the build's growth stays put as the merchant count grows, so
+    # its share per merchant falls; a linear build keeps the same KB per merchant
+    for mode in args.modes:
+        runs = sorted((result for result in results if result['mode'] == mode), key=lambda result: result['merchants'])
+        if len(runs) > 1:
+            smallest, largest = runs[0], runs[-1]
+            growth = largest['build_rss_mb'] / max(smallest['build_rss_mb'], 0.1)
+            scale = largest['merchants'] / smallest['merchants']
+            print(f"{mode}: {scale:.0f}x the merchants took {growth:.1f}x the build memory "
+                  f"(+{smallest['build_rss_mb']} MB at {smallest['merchants']}, "
+                  f"+{largest['build_rss_mb']} MB at {largest['merchants']})")
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
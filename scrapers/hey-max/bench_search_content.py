@@ -0,0 +1,87 @@
+import argparse
+import time
+
+import pandas as pd
+
+from bench_pdf import synthetic_merchants
+from process_merchants_mcc import create_search_optimized_content
+
+def iterrows_search_content(merchant_data):
+    """The original row-at-a-time builder, kept as the reference for output and timing"""
+    search_content = []
+
+    for _, row in merchant_data.iterrows():
+        merchant_name = str(row['Store'])
+        mcc_code = str(row['MCC'])
+        business_type = str(row['Type'])
+
+        entry = {
+            "merchant_name": merchant_name,
+            "merchant_name_lower": merchant_name.lower(),
+            "merchant_name_variations": [
+                merchant_name,
+                merchant_name.lower(),
+                merchant_name.upper(),
+                merchant_name.replace(" ", ""),
+                merchant_name.replace(" ", "_"),
+            ],
+            "mcc_code": mcc_code,
+            "business_type": business_type,
+            "search_key": f"{merchant_name} {mcc_code} {business_type}",
+            "search_key_normalized": f"{merchant_name.lower()} {mcc_code} {business_type.lower()}",
+            "qa_pairs": [
+                {
+                    "question": f"What is the MCC for {merchant_name}?",
+                    "answer": f"The MCC for {merchant_name} is {mcc_code}"
+                },
+                {
+                    "question": f"What type of business is {merchant_name}?",
+                    "answer": f"{merchant_name} is a {business_type} business with MCC {mcc_code}"
+                },
+                {
+                    "question": f"What is the business category for {merchant_name}?",
+                    "answer": f"{merchant_name} operates in the {business_type} category (MCC: {mcc_code})"
+                }
+            ],
+            "metadata": {
+                "has_unicode": any(ord(c) > 127 for c in merchant_name),
+                "name_length": len(merchant_name),
+                "contains_numbers": any(c.isdigit() for c in merchant_name)
+            }
+        }
+        search_content.append(entry)
+
+    return search_content
+
+def check_equivalence():
+    """Compare both builders on awkward names before timing anything"""
+    names = ["iHerb", "SP Services", "Straße 7", "Ünïcödé²", "食べログ", "A  B", "", "Ⅻ Store", "Mcdonalds"]
+    merchant_data = pd.DataFrame({
+        'Store': names,
+        'MCC': ['5411'] * len(names),
+        'Type': ['Grocery Stores, Supermarkets'] * len(names)
+    })
+    assert create_search_optimized_content(merchant_data) == iterrows_search_content(merchant_data)
+
+def time_call(function, merchant_data):
+    start = time.perf_counter()
+    function(merchant_data)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare iterrows and column-wise search content builders")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    check_equivalence()
+    print("Outputs match on edge-case names")
+
+    for count in args.sizes:
+        merchant_data = synthetic_merchants(count)
+        legacy = time_call(iterrows_search_content, merchant_data)
+        vectorized = time_call(create_search_optimized_content, merchant_data)
+        print(f"{count:>8} merchants  iterrows {legacy:>7.2f}s  column-wise {vectorized:>7.2f}s  "
+              f"speedup {legacy / vectorized:.1f}x")
+
+if __name__ == "__main__":
+    main()
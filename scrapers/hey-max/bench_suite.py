@@ -0,0 +1,246 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from bench_pdf import peak_rss_mb
+from mock_heymax_server import create_server, index_merchants, synthetic_merchant_rows
+
+STAGES = ['crawl', 'pdf', 'export']
+# (metric, True if a bigger number is better) for comparisons against a baseline
+COMPARED_METRICS = [
+    ('throughput_per_s', True),
+    ('p95_s', False),
+    ('peak_rss_mb', False),
+    ('output_mb', False),
+]
+
+def directory_size_mb(paths):
+    """Combined size of the given files in MB"""
+    return round(sum(os.path.getsize(path) for path in paths) / (1024 * 1024), 3)
+
+def write_inputs(count, directory):
+    """Write the synthetic stores.json the crawler reads and the merchant CSV the PDF/export stages read"""
+    rows = synthetic_merchant_rows(count)
+    with open(os.path.join(directory, 'stores.json'), 'w', encoding='utf-8') as file:
+        json.dump([store for store, _, _ in rows], file)
+    with open(os.path.join(directory, 'merchants.csv'), 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Store', 'MCC', 'Type'])
+        writer.writerows(rows)
+    return rows
+
+def crawl_p95(engine):
+    """p95 per-store latency from the crawl's own output in the current directory"""
+    if engine == 'async':
+        log_file = max(glob.glob('merchant_scraper_*.log'))
+        with open(log_file, encoding='utf-8') as file:
+            match = re.search(r'p95 ([\d.]+)s', file.read())
+        return float(match.group(1)) if match else None
+
+    totals = []
+    with open(max(glob.glob('merchant_metrics_*.jsonl')), encoding='utf-8') as file:
+        for line in file:
+            totals.append(json.loads(line)['total_s'])
+    totals.sort()
+    return totals[max(0, -(-len(totals) * 95 // 100) - 1)] if totals else None
+
+def run_crawl(directory, options):
+    """Crawl the mock server with fetch.py and measure it"""
+    os.chdir(directory)
+    if options['engine'] == 'async':
+        from async_fetch import fetch_merchant_data_async
+
+        crawl = lambda: fetch_merchant_data_async(
+            base_url=options['base_url'], concurrency=options['concurrency'], rate=0, burst=1,
+            max_retries=options['max_retries'], retry_backoff=options['retry_backoff'], aliases_file=None
+        )
+    else:
+        from fetch import fetch_merchant_data
+
+        crawl = lambda: fetch_merchant_data(
+            workers=options['workers'], browser_fallback=False, base_url=options['base_url'],
+            max_retries=options['max_retries'], retry_backoff=options['retry_backoff'], aliases_file=None
+        )
+
+    start = time.perf_counter()
+    try:
+        crawl()
+        exit_code = 0
+    except SystemExit as e:
+        exit_code = e.code
+    wall_time = time.perf_counter() - start
+
+    output_file = max(glob.glob('merchant_data_*.csv'))
+    with open(output_file, newline='', encoding='utf-8') as file:
+        rows = sum(1 for _ in file) - 1
+    return {
+        'wall_time_s': wall_time,
+        'items': rows,
+        'p95_s': crawl_p95(options['engine']),
+        'exit_code': exit_code,
+        'output_mb': directory_size_mb([output_file])
+    }
+
+def run_pdf(directory, options):
+    """Build the merchant PDF from the synthetic CSV and measure it"""
+    from merchant_pdf import create_merchant_pdf_enhanced
+    from process_merchants_mcc import process_merchant_data
+
+    merchant_data = process_merchant_data(os.path.join(directory, 'merchants.csv'))
+    output_file = os.path.join(directory, 'bench.pdf')
+    start = time.perf_counter()
+    create_merchant_pdf_enhanced(merchant_data, output_file, False, jobs=options['jobs'])
+    return {
+        'wall_time_s': time.perf_counter() - start,
+        'items': len(merchant_data),
+        'output_mb': directory_size_mb([output_file])
+    }
+
+def run_export(directory, options):
+    """Write every RAG export format and granularity from the synthetic CSV and measure it"""
+    from process_merchants_mcc import export_rag_formats, process_merchant_data
+
+    merchant_data = process_merchant_data(os.path.join(directory, 'merchants.csv'))
+    output_dir = os.path.join(directory, 'export')
+    start = time.perf_counter()
+    export_rag_formats(merchant_data, ['jsonl', 'parquet'], ['merchant', 'mcc'], output_dir)
+    return {
+        'wall_time_s': time.perf_counter() - start,
+        'items': len(merchant_data),
+        'output_mb': directory_size_mb(os.path.join(output_dir, name) for name in os.listdir(output_dir))
+    }
+
+def run_child(stage, directory, options):
+    """Run one stage in this process and print its measurements as JSON"""
+    runners = {'crawl': run_crawl, 'pdf': run_pdf, 'export': run_export}
+    result = runners[stage](directory, options)
+    result['throughput_per_s'] = round(result['items'] / result['wall_time_s'], 1) if result['wall_time_s'] else None
+    result['wall_time_s'] = round(result['wall_time_s'], 2)
+    result['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    print(json.dumps(result))
+
+def run_stage(stage, count, directory, options):
+    """Measure one stage in a fresh interpreter so peak RSS belongs to that stage alone"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', stage, directory, json.dumps(options)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{stage} at {count} merchants failed:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {'stage': stage, 'merchants': count, **result}
+
+def compare_with_baseline(results, baseline_file, tolerance):
+    """Print the change of every metric against a previous results file; returns the regressions"""
+    with open(baseline_file, encoding='utf-8') as file:
+        baseline = {(entry['stage'], entry['merchants']): entry for entry in json.load(file)['results']}
+
+    regressions = []
+    print(f"\nCompared with {baseline_file} (tolerance {tolerance:.0%}):")
+    for result in results:
+        previous = baseline.get((result['stage'], result['merchants']))
+        if not previous:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = ' REGRESSION'
+                regressions.append((result['stage'], result['merchants'], metric, old, new))
+            changes.append(f"{metric} {change:+.1%}{flag}")
+        print(f"  {result['stage']:<7} {result['merchants']:>7}  " + ', '.join(changes))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawler, PDF build and RAG export against a mock heymax site")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads')
+    parser.add_argument('--workers', type=int, default=16, help="Crawler threads with --engine threads")
+    parser.add_argument('--concurrency', type=int, default=64, help="Open requests with --engine async")
+    parser.add_argument('--max-retries', type=int, default=2)
+    parser.add_argument('--retry-backoff', type=float, default=0.05)
+    parser.add_argument('--jobs', type=int, default=1, help="PDF render processes")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Mock server delay per response")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Extra random delay of up to this much")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of 503 responses")
+    parser.add_argument('--page-kb', type=int, default=0, help="Filler markup per merchant page, in KB")
+    parser.add_argument('--output', default='bench_suite_results.json')
+    parser.add_argument('--baseline', help="Earlier results file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Relative change treated as a regression (default: 0.1)")
+    parser.add_argument('--child', nargs=3, metavar=('STAGE', 'DIRECTORY', 'OPTIONS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child[0], args.child[1], json.loads(args.child[2]))
+        return
+
+    settings = {key: value for key, value in vars(args).items() if key not in ('child', 'output', 'baseline')}
+    options = {key: settings[key] for key in
+               ('engine', 'workers', 'concurrency', 'max_retries', 'retry_backoff', 'jobs')}
+    results = []
+
+    for count in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            rows = write_inputs(count, directory)
+            for stage in args.stages:
+                server = None
+                if stage == 'crawl':
+                    # The mock site runs in this process; the crawler gets a process of its own
+                    server = create_server(
+                        merchants=index_merchants(rows),
+                        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                        failure_rate=args.failure_rate, page_kb=args.page_kb
+                    )
+                    threading.Thread(target=server.serve_forever, daemon=True).start()
+                    host, port = server.server_address[:2]
+                    options['base_url'] = f"http://{host}:{port}/merchant/"
+                try:
+                    result = run_stage(stage, count, directory, options)
+                finally:
+                    if server:
+                        server.shutdown()
+                        server.server_close()
+
+                results.append(result)
+                p95 = f"p95 {result['p95_s']:.3f}s  " if result.get('p95_s') is not None else ''
+                print(f"{stage:<7} {count:>7} merchants  {result['wall_time_s']:>8.2f}s  "
+                      f"{result['throughput_per_s']:>9.1f}/s  {p95}"
+                      f"peak RSS {result['peak_rss_mb']:>7.1f} MB  output {result['output_mb']:.2f} MB")
+
+    report = {
+        'created': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': settings,
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
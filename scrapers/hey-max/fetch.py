@@ -1,18 +1,22 @@
+import argparse
 import json
 import csv
 import logging
 import sys
 import os
-from bs4 import BeautifulSoup
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+import queue
+import re
+import threading
+import http.client
+from html.parser import HTMLParser
+from urllib.parse import quote, urlsplit
+from datetime import datetime, timedelta
 import time
 import traceback
+import unicodedata
 import shutil
+from contextlib import contextmanager
+from mcc_aggregates import input_digest
 
 # Exit codes
 EXIT_SUCCESS = 0
@@ -22,8 +26,71 @@ EXIT_FILE_ERROR = 3
 EXIT_BROWSER_ERROR = 4
 EXIT_UNKNOWN_ERROR = 5
 
+# The badge that carries "<MCC> (<type>)" on a merchant page
+MCC_BADGE_CLASS_TOKEN = "text-[#5046C5]"
+# Badge selectors, most specific first. The later ones keep extraction working if
+# the Tailwind class string changes: any class mentioning the badge colour, an
+# explicit data-mcc attribute, and finally any leaf element shaped like "1234 (Type)".
+MCC_BADGE_XPATHS = (
+    f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {MCC_BADGE_CLASS_TOKEN} ')]",
+    "//*[contains(@class, '5046C5')]",
+    "//*[@data-mcc]",
+    "//*[not(*) and substring(normalize-space(), 5, 2) = ' ('"
+    " and string-length(translate(substring(normalize-space(), 1, 4), '0123456789', '')) = 0]",
+)
+BADGE_TEXT_PATTERN = re.compile(r'^\s*\d{4} \(.*\)\s*$', re.S)
+# Runs inside the page: evaluate the selectors in order and hand back only the badge text
+BADGE_SCRIPT = """
+for (const xpath of arguments[0]) {
+    const node = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (node && node.textContent.trim()) return node.textContent.trim();
+}
+return null;
+"""
+
+DEFAULT_BASE_URL = "https://heymax.ai/merchant/"
+HTTP_USER_AGENT = "Mozilla/5.0 (compatible; show-near-me merchant scraper)"
+
+CSV_HEADER = ['Store', 'MCC', 'Type', 'Timestamp', 'Processing Time (s)', 'Ready Time (s)']
+CHECKPOINT_FILE = 'merchant_checkpoint.jsonl'
+FAILURE_LEDGER_FILE = 'merchant_failures.jsonl'
+# Optional {variant: canonical name} overrides applied before crawling
+ALIASES_FILE = 'store_aliases.json'
+
+# Requests a lean browser never makes: images, fonts, media and third-party analytics.
+# Scripts from heymax.ai itself still load, since they render the badge.
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico', '*/_next/image*',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot', '*.mp4', '*.webm',
+    '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*',
+    '*hotjar.com*', '*segment.io*', '*mixpanel.com*', '*clarity.ms*', '*intercom.io*'
+]
+# A lean browser also reloads every this-many-th page unblocked to measure what blocking saves
+BLOCKING_SAMPLE_EVERY = 50
+# Pages between checks of the browser's memory when recycling on RSS
+RSS_CHECK_EVERY = 10
+# transferSize is 0 for cache hits and for cross-origin responses without Timing-Allow-Origin, so this is a floor
+PAGE_TRANSFER_SCRIPT = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+return {
+    bytes: (nav ? nav.transferSize : 0) + resources.reduce((total, entry) => total + entry.transferSize, 0),
+    dom_ms: nav ? nav.domContentLoadedEventEnd : 0,
+    load_ms: nav ? nav.loadEventEnd : 0
+};
+"""
+
+# Upper bound on how long a page may take to render its badge
+READY_TIMEOUT = 10
+READY_POLL_INTERVAL = 0.1
+
 def setup_logging():
     """Setup logging configuration"""
+    # A caller such as pipeline.py may have set logging up already; keep writing to its log
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.FileHandler):
+            return os.path.relpath(handler.baseFilename)
+
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_filename = f'merchant_scraper_{timestamp}.log'
 
@@ -73,139 +140,1064 @@ def cleanup_resources(driver=None, temp_files=None, error_message=None, exit_cod
     if exit_code != EXIT_SUCCESS:
         sys.exit(exit_code)
 
-def fetch_merchant_data():
+class StoreLookupError(Exception):
+    """Raised when a single store lookup fails"""
+
+    def __init__(self, message, exit_code):
+        super().__init__(message)
+        self.exit_code = exit_code
+        self.attempts = 1
+
+    @property
+    def retryable(self):
+        # A page that loaded but has no badge will not grow one on retry
+        return self.exit_code != EXIT_NO_ELEMENT
+
+class CrawlJournal:
+    """Append-only JSON lines file, fsynced after every entry so a crash loses at most one line"""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    @staticmethod
+    def load(path):
+        """Return every complete entry in a journal, ignoring a torn final line"""
+        entries = []
+        if not os.path.exists(path):
+            return entries
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logging.warning(f"Ignoring incomplete line in {path}")
+        return entries
+
+    def record(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+class PhaseTimer:
+    """Wall time per named phase of one store's lookup, summed over retries"""
+
+    def __init__(self):
+        self.phases = {}
+        self.attempts = 0
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+class CrawlMetrics:
+    """Per-store phase timings, written as JSON lines and summarised at the end of a run"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'w', encoding='utf-8')
+        self.entries = []
+
+    def record(self, store, status, phases, attempts, worker=None, error=None):
+        entry = {
+            'store': store,
+            'status': status,
+            'attempts': attempts,
+            'worker': worker,
+            'total_s': round(sum(phases.values()), 4),
+            'phases': {name: round(seconds, 4) for name, seconds in phases.items()}
+        }
+        if error is not None:
+            entry['error'] = str(error)
+            entry['exit_code'] = error.exit_code
+        self.entries.append(entry)
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+    def log_summary(self, slowest=10):
+        if not self.entries:
+            return
+        ok = [entry for entry in self.entries if entry['status'] == 'ok']
+        failed = [entry for entry in self.entries if entry['status'] != 'ok']
+        retried = sum(1 for entry in self.entries if entry['attempts'] > 1)
+
+        logging.info(f"\nCrawl metrics ({len(self.entries)} stores, details in {self.path}):")
+        logging.info(f"  errors: {len(failed)} ({len(failed) / len(self.entries) * 100:.1f}%), "
+                     f"retried: {retried} ({retried / len(self.entries) * 100:.1f}%)")
+        for exit_code in sorted({entry['exit_code'] for entry in failed}):
+            count = sum(1 for entry in failed if entry['exit_code'] == exit_code)
+            logging.info(f"    exit code {exit_code}: {count}")
+
+        grand_total = sum(entry['total_s'] for entry in self.entries) or 1.0
+        phase_names = list(dict.fromkeys(name for entry in self.entries for name in entry['phases']))
+        logging.info(f"  {'phase':<12} {'share':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        for name in phase_names + ['total']:
+            if name == 'total':
+                values = [entry['total_s'] for entry in self.entries]
+            else:
+                values = [entry['phases'][name] for entry in self.entries if name in entry['phases']]
+            logging.info(
+                f"  {name:<12} {sum(values) / grand_total * 100:>5.1f}% {sum(values) / len(values):>7.3f}s "
+                f"{percentile(values, 50):>7.3f}s {percentile(values, 95):>7.3f}s "
+                f"{percentile(values, 99):>7.3f}s {max(values):>7.3f}s"
+            )
+
+        logging.info(f"  slowest {min(slowest, len(ok))} merchants:")
+        for entry in sorted(ok, key=lambda entry: -entry['total_s'])[:slowest]:
+            logging.info(f"    {entry['total_s']:>7.3f}s  {entry['store']}")
+
+def load_stores(path):
+    """Read the store list, skipping the // source comment at the top of stores.json"""
+    with open(path, 'r', encoding='utf-8') as file:
+        lines = [line for line in file if not line.lstrip().startswith('//')]
+    return json.loads(''.join(lines))
+
+def canonical_store_name(store):
+    """Name a store is requested and filed under: NFC-normalized, whitespace collapsed, case kept"""
+    # NFC rather than NFKC, which would turn "MC²" into a different page's "MC2"
+    return ' '.join(unicodedata.normalize('NFC', str(store)).split())
+
+def store_key(store):
+    """Case-insensitive key stores are deduplicated, checkpointed and cached under"""
+    return canonical_store_name(store).casefold()
+
+def load_store_aliases(path):
+    """Read {variant: canonical name} overrides keyed by store_key; a missing file means none"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as file:
+        aliases = json.load(file)
+    return {store_key(variant): canonical_store_name(name) for variant, name in aliases.items()}
+
+def normalize_stores(stores, aliases=None):
+    """
+    Collapse the raw store list to one canonical name per merchant page.
+
+    Names that only differ in case or spacing, or that an alias maps together,
+    share a page and are fetched once. The first spelling seen wins. Returns the
+    canonical names in input order, {canonical name: [raw names]} for every
+    merchant that was renamed or merged, and a summary of requests saved.
+    """
+    aliases = aliases or {}
+    canonical = {}
+    variants = {}
+    blank = 0
+    for store in stores:
+        name = canonical_store_name(store)
+        if not name:
+            blank += 1
+            continue
+        name = aliases.get(store_key(name), name)
+        name = canonical.setdefault(store_key(name), name)
+        variants.setdefault(name, []).append(store)
+
+    alias_map = {name: raw for name, raw in variants.items() if raw != [name]}
+    report = {
+        'input_entries': len(stores),
+        'unique_stores': len(canonical),
+        'requests_saved': len(stores) - len(canonical),
+        'blank_entries': blank,
+        'merged': sum(1 for raw in alias_map.values() if len(raw) > 1),
+        'renamed': sum(1 for name, raw in alias_map.items() if name not in raw)
+    }
+    return list(canonical.values()), alias_map, report
+
+def prepare_store_list(stores, aliases_file, report_file):
+    """Normalize the raw store list, log the savings and write the alias map next to the run's output"""
+    names, alias_map, report = normalize_stores(stores, load_store_aliases(aliases_file))
+    with open(report_file, 'w', encoding='utf-8') as file:
+        json.dump({'summary': report, 'aliases': alias_map}, file, indent=2, ensure_ascii=False)
+    logging.info(
+        f"Normalized {report['input_entries']} store entries to {report['unique_stores']} merchants "
+        f"({report['requests_saved']} requests saved, {report['merged']} merged, "
+        f"{report['blank_entries']} blank); alias map saved to {report_file}"
+    )
+    return names
+
+def find_latest_merchant_csv(directory='.'):
+    """Return the newest merchant_data_<timestamp>.csv in a directory, or None"""
+    candidates = sorted(
+        name for name in os.listdir(directory)
+        if re.fullmatch(r'merchant_data_\d{8}_\d{6}\.csv', name)
+    )
+    return os.path.join(directory, candidates[-1]) if candidates else None
+
+def load_merchant_cache(csv_file):
+    """Read a previous merchant_data CSV into {store_key: row}, padding rows to the current columns"""
+    cache = {}
+    with open(csv_file, 'r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if row:
+                cache[store_key(row[0])] = (row + [''] * len(CSV_HEADER))[:len(CSV_HEADER)]
+    return cache
+
+def is_fresh(row, max_age):
+    """Whether a cached row's Timestamp is younger than max_age"""
+    try:
+        fetched_at = datetime.strptime(row[3], "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return False
+    return datetime.now() - fetched_at < max_age
+
+def build_diff_report(stores, cache, refreshed, reused, failed, rows=None, base=None, output=None):
+    """
+    Compare freshly fetched rows against the cache they replace.
+
+    base and output are the input_digest() of the CSV the cache came from and of
+    the CSV written, and rows is how many rows that CSV has; mcc_aggregates uses
+    them to tell which file a store describes once the diff is applied.
+    """
+    added = []
+    changed = []
+    for store, row in refreshed.items():
+        old = cache.get(store_key(store))
+        if old is None:
+            added.append({'store': row[0], 'mcc': row[1], 'type': row[2]})
+        elif (old[1], old[2]) != (row[1], row[2]):
+            changed.append({
+                'store': row[0],
+                'old_mcc': old[1], 'new_mcc': row[1],
+                'old_type': old[2], 'new_type': row[2]
+            })
+
+    current = {store_key(store) for store in stores}
+    removed = [{'store': row[0], 'mcc': row[1], 'type': row[2]}
+               for key, row in cache.items() if key not in current]
+
+    return {
+        'base': base,
+        'output': output,
+        'summary': {
+            'stores': len(stores),
+            'rows': rows,
+            'refetched': len(refreshed),
+            'reused_from_cache': reused,
+            'failed': failed,
+            'added': len(added),
+            'removed': len(removed),
+            'changed': len(changed)
+        },
+        'added': added,
+        'removed': removed,
+        'changed': changed
+    }
+
+def parse_badge_text(full_text):
+    """Split the "<MCC> (<type>)" badge text into its MCC and type"""
+    full_text = full_text.strip()
+    return full_text[:4], clean_type_text(full_text)
+
+class BadgeParser(HTMLParser):
+    """
+    Streaming fallback for when lxml is not installed.
+
+    Mirrors MCC_BADGE_XPATHS in the same priority order and stops consuming
+    input as soon as the primary badge class has been read.
+    """
+
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+    def __init__(self):
+        super().__init__()
+        self.depth = 0
+        self.level = None
+        self.chunks = []
+        self.best = None
+        self.leaf_text = None
+        self.found = False
+
+    def _selector_level(self, attrs):
+        attrs = dict(attrs)
+        classes = attrs.get('class') or ''
+        if MCC_BADGE_CLASS_TOKEN in classes.split():
+            return 0
+        if '5046C5' in classes:
+            return 1
+        if 'data-mcc' in attrs:
+            return 2
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        if self.found or tag in self.VOID_TAGS:
+            return
+        if self.depth:
+            self.depth += 1
+            return
+        level = self._selector_level(attrs)
+        if level is not None and (self.best is None or level < self.best[0]):
+            self.depth = 1
+            self.level = level
+            self.chunks = []
+
+    def handle_endtag(self, tag):
+        if self.depth and tag not in self.VOID_TAGS:
+            self.depth -= 1
+            if not self.depth:
+                text = ''.join(self.chunks).strip()
+                if text:
+                    self.best = (self.level, text)
+                    self.found = self.level == 0
+
+    def handle_data(self, data):
+        if self.depth:
+            self.chunks.append(data)
+        elif self.leaf_text is None and BADGE_TEXT_PATTERN.match(data):
+            self.leaf_text = data.strip()
+
+    def feed_until_found(self, html, chunk_size=16384):
+        for start in range(0, len(html), chunk_size):
+            self.feed(html[start:start + chunk_size])
+            if self.found:
+                return
+
+    @property
+    def text(self):
+        if self.best:
+            return self.best[1]
+        return self.leaf_text
+
+def extract_html_badge(html):
+    """Badge text from an HTML document using the first selector that matches, or None"""
+    try:
+        import lxml.html
+    except ImportError:
+        parser = BadgeParser()
+        parser.feed_until_found(html)
+        return parser.text
+
+    if not html.strip():
+        return None
+    tree = lxml.html.fromstring(html)
+    for xpath in MCC_BADGE_XPATHS:
+        for node in tree.xpath(xpath):
+            text = node.text_content().strip()
+            if text:
+                return text
+    return None
+
+def extract_badge(content_type, body):
+    """Pull the badge text out of an HTML page or JSON merchant document, or return None"""
+    if 'json' in content_type:
+        data = json.loads(body)
+        mcc = data.get('mcc')
+        merchant_type = data.get('type') or data.get('category')
+        return f"{mcc} ({merchant_type or ''})" if mcc else None
+
+    return extract_html_badge(body.decode('utf-8', errors='replace'))
+
+def create_driver(lean=False):
+    """Create a headless Chrome WebDriver; a lean driver skips images, fonts and analytics"""
+    # Selenium is only imported once a browser is actually needed; the HTTP backend never pays for it
+    from selenium import webdriver
+
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-logging')
+    chrome_options.add_argument('--log-level=3')
+    if not lean:
+        return webdriver.Chrome(options=chrome_options)
+
+    # The badge is in the DOM by DOMContentLoaded; the readiness wait covers client-side rendering
+    chrome_options.page_load_strategy = 'eager'
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+    return driver
+
+def process_tree_rss_mb(pid):
+    """Resident memory of a process and its descendants in MB, or None where it cannot be measured"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil:
+        try:
+            parent = psutil.Process(pid)
+            processes = [parent] + parent.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total / (1024 * 1024)
+
+    # Without psutil, walk /proc on Linux
+    if not os.path.isdir('/proc'):
+        return None
+    children = {}
+    rss = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as file:
+                fields = dict(line.split(':', 1) for line in file if ':' in line)
+        except OSError:
+            continue
+        children.setdefault(int(fields['PPid']), []).append(int(entry))
+        rss[int(entry)] = int(fields.get('VmRSS', '0 kB').split()[0])
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total / 1024
+
+class SeleniumBackend:
+    """
+    Render merchant pages in a headless Chrome and read the badge from the DOM.
+
+    With lean=True the browser blocks images, fonts and analytics and stops
+    waiting for the page at DOMContentLoaded. Every sample_every-th page is
+    loaded a second time without blocking, so the bandwidth and load time the
+    blocking saves are measured, not guessed. The browser is restarted every
+    recycle_pages pages, or sooner once its processes exceed max_rss_mb.
+    """
+
+    name = 'selenium'
+
+    def __init__(self, lean=False, recycle_pages=0, max_rss_mb=0, sample_every=BLOCKING_SAMPLE_EVERY):
+        self.driver = None
+        self.lean = lean
+        self.recycle_pages = recycle_pages
+        self.max_rss_mb = max_rss_mb
+        self.sample_every = sample_every
+        self.pages = 0
+        self.pages_on_driver = 0
+        self.recycled = 0
+        self.samples = []
+
+    def _start_driver(self):
+        try:
+            self.driver = create_driver(lean=self.lean)
+            self.pages_on_driver = 0
+            logging.info("Chrome browser initialized successfully" + (" (lean profile)" if self.lean else ""))
+        except Exception as e:
+            raise StoreLookupError(f"Failed to initialize browser: {str(e)}", EXIT_BROWSER_ERROR)
+
+    def _recycle_reason(self):
+        if self.recycle_pages and self.pages_on_driver >= self.recycle_pages:
+            return f"after {self.pages_on_driver} pages"
+        if self.max_rss_mb and self.pages_on_driver % RSS_CHECK_EVERY == 0:
+            rss = process_tree_rss_mb(self.driver.service.process.pid)
+            if rss is not None and rss > self.max_rss_mb:
+                return f"at {rss:.0f} MB RSS"
+        return None
+
+    def _page_transfer(self, wait_event):
+        """(bytes transferred, milliseconds until the page load returns) once every request has settled"""
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        WebDriverWait(self.driver, READY_TIMEOUT, poll_frequency=READY_POLL_INTERVAL).until(
+            lambda driver: driver.execute_script("return document.readyState") == 'complete'
+        )
+        result = self.driver.execute_script(PAGE_TRANSFER_SCRIPT)
+        return result['bytes'], result[wait_event]
+
+    def _sample_blocking(self, url):
+        """Load the current page again with nothing blocked and record both measurements"""
+        try:
+            self.driver.execute_cdp_cmd('Network.setCacheDisabled', {'cacheDisabled': True})
+            self.driver.get(url)
+            # A lean browser returns at DOMContentLoaded, a default one only after the load event
+            lean = self._page_transfer('dom_ms')
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': []})
+            self.driver.get(url)
+            full = self._page_transfer('load_ms')
+            self.samples.append((lean, full))
+        except Exception as e:
+            logging.debug(f"Could not sample resource blocking on {url}: {e}")
+        finally:
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+            self.driver.execute_cdp_cmd('Network.setCacheDisabled', {'cacheDisabled': False})
+
+    def fetch_badge(self, url, store, timer):
+        """Return (badge text, seconds until the page was ready)"""
+        from selenium.common.exceptions import JavascriptException, TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        if self.driver is not None:
+            reason = self._recycle_reason()
+            if reason:
+                logging.info(f"Recycling browser {reason}")
+                self.driver.quit()
+                self.driver = None
+                self.recycled += 1
+        if self.driver is None:
+            self._start_driver()
+
+        self.pages += 1
+        self.pages_on_driver += 1
+        if self.lean and self.sample_every and self.pages % self.sample_every == 1 % self.sample_every:
+            with timer.phase('sample'):
+                self._sample_blocking(url)
+
+        with timer.phase('navigation'):
+            self.driver.get(url)
+
+        # Poll the page with the selector script and return as soon as the badge renders;
+        # only the badge text crosses the WebDriver connection, not the whole DOM
+        ready_start = time.time()
+        try:
+            with timer.phase('wait'):
+                text = WebDriverWait(self.driver, READY_TIMEOUT, poll_frequency=READY_POLL_INTERVAL).until(
+                    lambda driver: driver.execute_script(BADGE_SCRIPT, MCC_BADGE_XPATHS)
+                )
+            return text, round(time.time() - ready_start, 2)
+        except TimeoutException:
+            # The page may have rendered with markup none of the selectors expect; check the source once
+            ready_time = round(time.time() - ready_start, 2)
+        except JavascriptException as e:
+            logging.debug(f"Selector script failed on {store}, parsing page source instead: {e}")
+            ready_time = round(time.time() - ready_start, 2)
+
+        with timer.phase('page_source'):
+            page_source = self.driver.page_source
+        with timer.phase('parse'):
+            text = extract_html_badge(page_source)
+        if not text:
+            raise StoreLookupError(f"Timeout waiting for element on {store}", EXIT_TIMEOUT)
+
+        return text, ready_time
+
+    def resource_summary(self):
+        """Mean per-page transfer and load time with and without blocking, from the sampled pages"""
+        if not self.samples:
+            return None
+        count = len(self.samples)
+        lean_kb = sum(lean[0] for lean, _ in self.samples) / count / 1024
+        full_kb = sum(full[0] for _, full in self.samples) / count / 1024
+        lean_ms = sum(lean[1] for lean, _ in self.samples) / count
+        full_ms = sum(full[1] for _, full in self.samples) / count
+        return {
+            'sampled_pages': count,
+            'lean_kb': round(lean_kb, 1), 'full_kb': round(full_kb, 1),
+            'saved_kb': round(full_kb - lean_kb, 1),
+            'lean_ms': round(lean_ms), 'full_ms': round(full_ms),
+            'saved_ms': round(full_ms - lean_ms)
+        }
+
+    def close(self):
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+            logging.info("Browser closed successfully")
+        summary = self.resource_summary()
+        if summary:
+            logging.info(
+                f"Resource blocking over {summary['sampled_pages']} sampled pages: "
+                f"{summary['full_kb']} KB -> {summary['lean_kb']} KB per page (saved {summary['saved_kb']} KB), "
+                f"page load {summary['full_ms']} ms -> {summary['lean_ms']} ms (saved {summary['saved_ms']} ms)"
+            )
+        if self.recycled:
+            logging.info(f"Browser recycled {self.recycled} times over {self.pages} pages")
+
+class HttpBackend:
+    """Fetch merchant pages over plain keep-alive HTTP, without a browser
+
+    Accepts either server-rendered HTML containing the MCC badge or a JSON
+    document with "mcc" and "type" (or "category") fields. Connections are
+    pooled per host for the lifetime of the backend, so each worker reuses
+    one socket for all of its stores.
+    """
+
+    name = 'http'
+
+    def __init__(self, fallback=None):
+        self.connections = {}
+        self.fallback = fallback
+
+    def _connection(self, scheme, netloc):
+        key = (scheme, netloc)
+        if key not in self.connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            self.connections[key] = connection_class(netloc, timeout=READY_TIMEOUT)
+        return self.connections[key]
+
+    def _get(self, url):
+        parts = urlsplit(url)
+        path = quote(parts.path or '/', safe='/%')
+        if parts.query:
+            path += '?' + parts.query
+        headers = {'User-Agent': HTTP_USER_AGENT, 'Accept': 'application/json, text/html'}
+
+        # A pooled connection may have been closed by the server; retry once on a fresh socket
+        for attempt in range(2):
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                return response.status, response.getheader('Content-Type', ''), response.read()
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                del self.connections[(parts.scheme, parts.netloc)]
+                if attempt:
+                    raise
+            except TimeoutError:
+                connection.close()
+                del self.connections[(parts.scheme, parts.netloc)]
+                raise
+
+    def fetch_badge(self, url, store, timer):
+        """Return (badge text, seconds until the response was ready)"""
+        ready_start = time.time()
+        try:
+            with timer.phase('navigation'):
+                status, content_type, body = self._get(url)
+        except TimeoutError:
+            raise StoreLookupError(f"Timeout waiting for element on {store}", EXIT_TIMEOUT)
+        ready_time = round(time.time() - ready_start, 2)
+
+        if status == 404:
+            raise StoreLookupError(f"HTTP {status} for: {store}", EXIT_NO_ELEMENT)
+        if status != 200:
+            raise StoreLookupError(f"HTTP {status} for: {store}", EXIT_UNKNOWN_ERROR)
+
+        with timer.phase('parse'):
+            full_text = extract_badge(content_type, body)
+        if full_text:
+            return full_text, ready_time
+
+        # The page may only render the badge client-side
+        if self.fallback:
+            logging.info(f"No badge in HTTP response for {store}, falling back to {self.fallback.name}")
+            return self.fallback.fetch_badge(url, store, timer)
+
+        raise StoreLookupError(f"No element found for: {store}", EXIT_NO_ELEMENT)
+
+    def close(self):
+        for connection in self.connections.values():
+            connection.close()
+        self.connections.clear()
+        if self.fallback:
+            self.fallback.close()
+
+def create_backend(name, browser_fallback=True, browser_options=None):
+    """Build a fresh fetch backend for one worker"""
+    browser_options = browser_options or {}
+    if name == 'selenium':
+        return SeleniumBackend(**browser_options)
+    return HttpBackend(fallback=SeleniumBackend(**browser_options) if browser_fallback else None)
+
+def scrape_store(backend, store, base_url, timer):
+    """Look up the MCC for a single store and return its CSV row"""
+    start_time = time.time()
+    formatted_store = canonical_store_name(store)
+    url = base_url + formatted_store
+    logging.debug(f"Processing URL: {url}")
+
+    try:
+        full_text, ready_time = backend.fetch_badge(url, formatted_store, timer)
+
+        mcc, merchant_type = parse_badge_text(full_text)
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        processing_time = round(time.time() - start_time, 2)
+
+        logging.info(f"Processed {formatted_store}: MCC {mcc} ({merchant_type}) in {processing_time}s")
+
+        return [formatted_store, mcc, merchant_type, current_time, processing_time, ready_time]
+
+    except StoreLookupError:
+        raise
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise StoreLookupError(f"Error processing {formatted_store}: {str(e)}", EXIT_UNKNOWN_ERROR)
+
+def scrape_with_retries(backend, store, base_url, max_retries, retry_backoff, stop_event, timer):
+    """Retry transient lookup failures with exponential backoff"""
+    for attempt in range(1, max_retries + 2):
+        timer.attempts = attempt
+        try:
+            return scrape_store(backend, store, base_url, timer)
+        except StoreLookupError as e:
+            e.attempts = attempt
+            if attempt > max_retries or not e.retryable or stop_event.is_set():
+                raise
+            delay = retry_backoff * 2 ** (attempt - 1)
+            logging.warning(f"{e} (attempt {attempt} of {max_retries + 1}), retrying in {delay:.1f}s")
+            with timer.phase('backoff'):
+                stop_event.wait(delay)
+
+def run_worker(worker_id, work_queue, results, stop_event, base_url, backend_name, browser_fallback,
+               max_retries, retry_backoff, browser_options=None, profiles=None):
+    """Drain one worker's queue with its own reusable fetch backend"""
+    profiler = None
+    if profiles is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ profiles through sys.monitoring, where the profiler already
+            # running in the main thread sees every thread and a second one cannot start
+            profiler = None
+    backend = create_backend(backend_name, browser_fallback, browser_options)
+    logging.info(f"Worker {worker_id}: using {backend.name} backend")
+    try:
+        while not stop_event.is_set():
+            item = work_queue.get()
+            if item is None:
+                break
+            index, store = item
+            timer = PhaseTimer()
+            try:
+                row = scrape_with_retries(backend, store, base_url, max_retries, retry_backoff, stop_event, timer)
+                results.put((index, row, None, timer, worker_id))
+            except StoreLookupError as e:
+                results.put((index, None, e, timer, worker_id))
+    finally:
+        backend.close()
+        if profiler:
+            profiler.disable()
+            profiles.append(profiler)
+
+def fetch_merchant_data(workers=1, backend='http', browser_fallback=True,
+                        stores_file='stores.json', base_url=DEFAULT_BASE_URL,
+                        checkpoint_file=CHECKPOINT_FILE, failure_file=FAILURE_LEDGER_FILE,
+                        resume=False, max_retries=3, retry_backoff=2.0,
+                        incremental=False, cache_csv=None, ttl_days=7, aliases_file=ALIASES_FILE,
+                        row_sink=None, browser_options=None, profiles=None, csv_filename=None):
     # Setup logging
     log_filename = setup_logging()
     temp_files = [log_filename]
-    driver = None
+
+    # Create output filenames with timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    csv_filename = csv_filename or f'merchant_data_{timestamp}.csv'
+    diff_filename = f'merchant_diff_{timestamp}.json'
+    aliases_filename = f'merchant_aliases_{timestamp}.json'
 
     try:
         # Read the JSON file
-        logging.info("Reading stores.json file...")
-        with open('stores.json', 'r') as file:
-            stores = json.load(file)
+        logging.info(f"Reading {stores_file} file...")
+        stores = prepare_store_list(load_stores(stores_file), aliases_file, aliases_filename)
     except Exception as e:
         cleanup_resources(temp_files=temp_files,
-                        error_message=f"Failed to read stores.json: {str(e)}",
+                        error_message=f"Failed to read {stores_file}: {str(e)}",
                         exit_code=EXIT_FILE_ERROR)
 
     # Initialize counter
     total_stores = len(stores)
     counter = 0
 
-    # Create CSV filename with timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    csv_filename = f'merchant_data_{timestamp}.csv'
-    temp_files.append(csv_filename)
+    # Stores already in the checkpoint journal are not fetched again
+    completed = {}
+    if resume:
+        for entry in CrawlJournal.load(checkpoint_file):
+            completed[store_key(entry['store'])] = entry['row']
+        logging.info(f"Resuming: {len(completed)} stores already done in {checkpoint_file}")
 
-    try:
-        # Setup Chrome options
-        logging.info("Setting up Chrome browser...")
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument('--headless')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-logging')
-        chrome_options.add_argument('--log-level=3')
-
-        # Initialize the driver
-        driver = webdriver.Chrome(options=chrome_options)
-        logging.info("Chrome browser initialized successfully")
+    # In incremental mode, rows from the last snapshot are reused until they outlive the TTL
+    cache = {}
+    if incremental:
+        cache_csv = cache_csv or find_latest_merchant_csv()
+        if cache_csv:
+            cache = load_merchant_cache(cache_csv)
+            logging.info(f"Loaded {len(cache)} cached rows from {cache_csv} (TTL {ttl_days} days)")
+        else:
+            logging.info("No previous merchant_data CSV found, fetching everything")
+    max_age = timedelta(days=ttl_days)
 
-    except Exception as e:
-        cleanup_resources(temp_files=temp_files,
-                        error_message=f"Failed to initialize browser: {str(e)}",
-                        exit_code=EXIT_BROWSER_ERROR)
+    pending = {}
+    refreshed = {}
+    todo = []
+    reused = 0
+    for index, store in enumerate(stores):
+        cached = cache.get(store_key(store))
+        if store_key(store) in completed:
+            pending[index] = completed[store_key(store)]
+            # Fetched by the interrupted run, so the diff must compare it with the cache too
+            refreshed[store] = pending[index]
+        elif cached and is_fresh(cached, max_age):
+            # Older CSVs spelled names differently (e.g. title case); write the canonical name
+            pending[index] = [store] + cached[1:]
+            reused += 1
+        else:
+            todo.append((index, store))
+    workers = max(1, min(workers, len(todo)))
+
+    metrics = CrawlMetrics(f'merchant_metrics_{timestamp}.jsonl')
+
+    checkpoint = CrawlJournal(checkpoint_file, resume=resume)
+    failure_ledger = CrawlJournal(failure_file, resume=resume)
+    failures = []
+
+    # Give every worker its own queue, filled round-robin so the split is deterministic
+    logging.info(f"Setting up {workers} {backend} worker(s) for {len(todo)} stores...")
+    work_queues = [queue.Queue() for _ in range(workers)]
+    for position, item in enumerate(todo):
+        work_queues[position % workers].put(item)
+    for work_queue in work_queues:
+        work_queue.put(None)
+
+    results = queue.Queue()
+    stop_event = threading.Event()
+    threads = [
+        threading.Thread(
+            target=run_worker,
+            args=(worker_id, work_queue, results, stop_event, base_url, backend, browser_fallback,
+                  max_retries, retry_backoff, browser_options, profiles),
+            name=f"worker-{worker_id}",
+            daemon=True
+        )
+        for worker_id, work_queue in enumerate(work_queues, 1)
+    ]
+    for thread in threads:
+        thread.start()
 
     # Open CSV file for writing
     with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
         csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['Store', 'MCC', 'Type', 'Timestamp', 'Processing Time (s)'])
+        csv_writer.writerow(CSV_HEADER)
 
-        base_url = "https://heymax.ai/merchant/"
+        # Rows arrive out of order; hold them back until every earlier store is written.
+        # A failed store leaves a None placeholder so later rows are not held up.
+        # A fetched store's metrics wait with its row, so they include the CSV write.
+        ready_times = []
+        written = 0
+        unrecorded = {}
 
         try:
-            for store in stores:
-                counter += 1
-                start_time = time.time()
-
-                logging.info(f"\nProcessing {counter} of {total_stores} ({(counter/total_stores*100):.1f}%)")
+            while True:
+                while counter in pending:
+                    index = counter
+                    row = pending.pop(index)
+                    counter += 1
+                    status, timer, worker_id, error = unrecorded.pop(index, (None, PhaseTimer(), None, None))
+                    if row is not None:
+                        with timer.phase('csv_write'):
+                            csv_writer.writerow(row)
+                        written += 1
+                    if status:
+                        metrics.record(stores[index], status, timer.phases, timer.attempts,
+                                       worker=worker_id, error=error)
+                    if row is None:
+                        continue
+                    if row_sink:
+                        row_sink(row)
+                    logging.info(f"\nProcessing {counter} of {total_stores} ({(counter/total_stores*100):.1f}%)")
 
-                formatted_store = store.title()
-                url = base_url + formatted_store
-                logging.info(f"Processing URL: {url}")
+                if counter >= total_stores:
+                    break
 
-                try:
-                    driver.get(url)
-
-                    try:
-                        WebDriverWait(driver, 10).until(
-                            EC.presence_of_element_located((By.CLASS_NAME, "font-inter"))
-                        )
-                        time.sleep(3)
-
-                        page_source = driver.page_source
-                        soup = BeautifulSoup(page_source, 'html.parser')
-
-                        target_element = soup.find(class_="px-2 py-1 font-inter text-[12px] font-medium text-[#5046C5]")
-
-                        if target_element:
-                            full_text = target_element.text.strip()
-                            mcc = full_text[:4]
-                            merchant_type = clean_type_text(full_text)
-                            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            processing_time = round(time.time() - start_time, 2)
-
-                            csv_writer.writerow([
-                                formatted_store,
-                                mcc,
-                                merchant_type,
-                                current_time,
-                                processing_time
-                            ])
-
-                            logging.info(f"Successfully processed: {formatted_store}")
-                            logging.info(f"MCC: {mcc}")
-                            logging.info(f"Type: {merchant_type}")
-                            logging.info(f"Processing time: {processing_time}s")
-                        else:
-                            error_msg = f"No element found for: {formatted_store}"
-                            logging.error(error_msg)
-                            cleanup_resources(
-                                driver=driver,
-                                temp_files=temp_files,
-                                error_message=error_msg,
-                                exit_code=EXIT_NO_ELEMENT
-                            )
-
-                    except TimeoutException:
-                        error_msg = f"Timeout waiting for element on {formatted_store}"
-                        logging.error(error_msg)
-                        cleanup_resources(
-                            driver=driver,
-                            temp_files=temp_files,
-                            error_message=error_msg,
-                            exit_code=EXIT_TIMEOUT
-                        )
-
-                except Exception as e:
-                    error_msg = f"Error processing {formatted_store}: {str(e)}"
-                    logging.error(error_msg)
-                    logging.error(traceback.format_exc())
-                    cleanup_resources(
-                        driver=driver,
-                        temp_files=temp_files,
-                        error_message=error_msg,
-                        exit_code=EXIT_UNKNOWN_ERROR
-                    )
+                index, row, error, timer, worker_id = results.get()
+                if error:
+                    logging.error(f"Giving up on {stores[index]} after {error.attempts} attempt(s): {error}")
+                    failure_ledger.record({
+                        'store': stores[index],
+                        'error': str(error),
+                        'exit_code': error.exit_code,
+                        'attempts': error.attempts,
+                        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    })
+                    failures.append(error)
+                    # Keep serving the stale row rather than dropping the merchant
+                    row = cache.get(store_key(stores[index]))
+                    if row:
+                        row = [stores[index]] + row[1:]
+                else:
+                    with timer.phase('checkpoint'):
+                        checkpoint.record({'store': stores[index], 'row': row})
+                    refreshed[stores[index]] = row
+                    ready_times.append(row[5])
+                pending[index] = row
+                unrecorded[index] = ('error' if error else 'ok', timer, worker_id, error)
 
         finally:
-            cleanup_resources(driver=driver)
+            stop_event.set()
+            for work_queue in work_queues:
+                work_queue.put(None)
+            for thread in threads:
+                thread.join()
+            checkpoint.close()
+            failure_ledger.close()
+            # Stores still held back when the crawl stopped early were fetched but never written
+            for index, (status, timer, worker_id, error) in sorted(unrecorded.items()):
+                metrics.record(stores[index], status, timer.phases, timer.attempts, worker=worker_id, error=error)
+            metrics.close()
 
-    logging.info(f"\nProcessing complete! {counter} stores processed")
+    logging.info(f"\nProcessing complete! {written} of {total_stores} stores saved")
+    metrics.log_summary()
+    if ready_times:
+        ready_times.sort()
+        logging.info(
+            f"Page ready time: mean {sum(ready_times) / len(ready_times):.2f}s, "
+            f"median {ready_times[len(ready_times) // 2]:.2f}s, max {ready_times[-1]:.2f}s"
+        )
     logging.info(f"Data has been saved to {csv_filename}")
+
+    if incremental:
+        report = build_diff_report(stores, cache, refreshed, reused, len(failures), written,
+                                   input_digest(cache_csv) if cache_csv else None, input_digest(csv_filename))
+        with open(diff_filename, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        summary = report['summary']
+        logging.info(
+            f"Incremental refresh: {summary['refetched']} fetched, {summary['reused_from_cache']} reused, "
+            f"{summary['added']} added, {summary['removed']} removed, {summary['changed']} changed"
+        )
+        logging.info(f"Diff report has been saved to {diff_filename}")
     logging.info(f"Logs have been saved to {log_filename}")
 
+    if failures:
+        cleanup_resources(
+            error_message=f"{len(failures)} stores failed, see {failure_file}; rerun with --resume to retry them",
+            exit_code=failures[0].exit_code
+        )
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Scrape merchant MCC codes from heymax.ai")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of fetch workers to run in parallel (default: 1)")
+    parser.add_argument('--backend', choices=['http', 'selenium'], default='http',
+                        help="How to fetch merchant pages (default: http)")
+    parser.add_argument('--no-browser-fallback', dest='browser_fallback', action='store_false',
+                        help="Do not retry pages without a server-rendered badge in Chrome")
+    parser.add_argument('--lean-browser', action='store_true',
+                        help="Block images, fonts and analytics in Chrome and report the savings")
+    parser.add_argument('--recycle-pages', type=int, default=0,
+                        help="Restart each Chrome after this many pages, 0 to never (default: 0)")
+    parser.add_argument('--max-browser-rss-mb', type=int, default=0,
+                        help="Restart Chrome once its processes use more memory than this, 0 for no limit")
+    parser.add_argument('--stores', default='stores.json',
+                        help="JSON list of store names to look up (default: stores.json)")
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL,
+                        help=f"Merchant page prefix, e.g. a local stub server (default: {DEFAULT_BASE_URL})")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE,
+                        help=f"Journal of completed stores (default: {CHECKPOINT_FILE})")
+    parser.add_argument('--failures', default=FAILURE_LEDGER_FILE,
+                        help=f"Ledger of stores that exhausted their retries (default: {FAILURE_LEDGER_FILE})")
+    parser.add_argument('--aliases', default=ALIASES_FILE,
+                        help=f"JSON object mapping store name variants to the name to crawl, "
+                             f"used if it exists (default: {ALIASES_FILE})")
+    parser.add_argument('--resume', action='store_true',
+                        help="Skip stores already recorded in the checkpoint journal")
+    parser.add_argument('--max-retries', type=int, default=3,
+                        help="Retries per store for timeouts and transient errors (default: 3)")
+    parser.add_argument('--retry-backoff', type=float, default=2.0,
+                        help="Initial retry delay in seconds, doubled on each attempt (default: 2)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Reuse rows from the latest merchant_data CSV and only fetch new or stale stores")
+    parser.add_argument('--cache-csv',
+                        help="Previous merchant_data CSV to use as the cache (default: the newest one)")
+    parser.add_argument('--ttl-days', type=float, default=7,
+                        help="Age after which a cached row is fetched again (default: 7)")
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads',
+                        help="threads: one backend per --workers thread; async: one asyncio event loop "
+                             "over plain HTTP (default: threads)")
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help="Requests in flight at once with --engine async (default: 16)")
+    parser.add_argument('--rate', type=float, default=10.0,
+                        help="Requests per second per host with --engine async, 0 for no limit (default: 10)")
+    parser.add_argument('--profile', action='store_true',
+                        help="Run under cProfile, including the worker threads, and save the stats to "
+                             "merchant_profile_<timestamp>.prof")
+    args = parser.parse_args(argv)
+    if args.engine == 'async' and (args.incremental or args.backend != 'http'):
+        parser.error("--engine async only supports the http backend without --incremental")
+    return args
+
+def run_profiled(function, *args, **kwargs):
+    """
+    Run a crawl under cProfile, save the raw stats and log the top functions.
+
+    The function gets a profiles list; worker threads add their own profilers to it,
+    and those are merged with the main thread's so fetching and parsing show up.
+    """
+    import cProfile
+    import io
+    import pstats
+
+    profile_filename = f'merchant_profile_{datetime.now().strftime("%Y%m%d_%H%M%S")}.prof'
+    profiler = cProfile.Profile()
+    profiles = []
+    try:
+        return profiler.runcall(function, *args, profiles=profiles, **kwargs)
+    finally:
+        report = io.StringIO()
+        stats = pstats.Stats(profiler, stream=report)
+        for worker_profiler in profiles:
+            stats.add(worker_profiler)
+        stats.dump_stats(profile_filename)
+        stats.sort_stats('cumulative').print_stats(25)
+        logging.info(f"\nProfile of the main thread and {len(profiles)} worker(s) saved to {profile_filename}\n"
+                     f"{report.getvalue()}")
+
+def main(args, profiles=None):
+    if args.engine == 'async':
+        from async_fetch import fetch_merchant_data_async
+        fetch_merchant_data_async(
+            stores_file=args.stores,
+            base_url=args.base_url,
+            concurrency=args.concurrency,
+            rate=args.rate,
+            burst=max(1, int(args.rate)),
+            checkpoint_file=args.checkpoint,
+            failure_file=args.failures,
+            resume=args.resume,
+            max_retries=args.max_retries,
+            retry_backoff=args.retry_backoff,
+            aliases_file=args.aliases
+        )
+        return
+    fetch_merchant_data(
+        workers=args.workers,
+        backend=args.backend,
+        browser_fallback=args.browser_fallback,
+        stores_file=args.stores,
+        base_url=args.base_url,
+        checkpoint_file=args.checkpoint,
+        failure_file=args.failures,
+        resume=args.resume,
+        max_retries=args.max_retries,
+        retry_backoff=args.retry_backoff,
+        incremental=args.incremental,
+        cache_csv=args.cache_csv,
+        ttl_days=args.ttl_days,
+        aliases_file=args.aliases,
+        browser_options={
+            'lean': args.lean_browser,
+            'recycle_pages': args.recycle_pages,
+            'max_rss_mb': args.max_browser_rss_mb
+        },
+        profiles=profiles
+    )
+
+def run(argv=None):
+    """Command line entry point, shared by fetch.py and heymax.py crawl"""
+    args = parse_args(argv)
+    if args.profile:
+        run_profiled(main, args)
+    else:
+        main(args)
+
 if __name__ == "__main__":
-    fetch_merchant_data()
+    run()
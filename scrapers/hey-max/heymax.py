@@ -0,0 +1,113 @@
+import argparse
+import os
+import subprocess
+import sys
+
+# Each command imports its module only once it is chosen, so `heymax.py stats` never
+# loads pandas and `heymax.py crawl` never loads ReportLab or, with the HTTP backend, Selenium.
+
+def crawl(argv):
+    from fetch import run
+    run(argv)
+
+def pipeline(argv):
+    from pipeline import main
+    main(argv)
+
+def build_pdf(argv):
+    from process_merchants_mcc import main
+    main(argv)
+
+def export(argv):
+    from process_merchants_mcc import main
+    if '--export' not in argv:
+        argv = argv + ['--export', 'jsonl']
+    main(argv + ['--skip-pdf'])
+
+def stats(argv):
+    from mcc_aggregates import main
+    main(['show'] + argv)
+
+def aggregates(argv):
+    from mcc_aggregates import main
+    main(argv)
+
+def lookup(argv):
+    from merchant_lookup import main
+    main(argv)
+
+def snapshot(argv):
+    from merchant_store import main
+    main(argv)
+
+# command: (handler, module it imports, help, import budget in ms)
+COMMANDS = {
+    'crawl': (crawl, 'fetch', "Fetch merchant MCC codes (fetch.py)", 100),
+    'pipeline': (pipeline, 'pipeline', "Crawl, aggregate and export in one streaming pass (pipeline.py)", 650),
+    'build-pdf': (build_pdf, 'process_merchants_mcc', "Build the reference PDF (process_merchants_mcc.py)", 550),
+    'export': (export, 'process_merchants_mcc', "Write RAG exports without the PDF; --export defaults to jsonl", 550),
+    'stats': (stats, 'mcc_aggregates', "Summarise the MCC aggregate store (mcc_aggregates.py show)", 30),
+    'aggregates': (aggregates, 'mcc_aggregates', "Build or update the MCC aggregate store (mcc_aggregates.py)", 30),
+    'lookup': (lookup, 'merchant_lookup', "Look up merchants by name (merchant_lookup.py)", 30),
+    'snapshot': (snapshot, 'merchant_store', "Build or inspect .mcs snapshots (merchant_store.py)", 30),
+}
+
+IMPORT_PROBE = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)"
+
+def measure_import_ms(module, runs):
+    """Best-of-runs import time of a module, each in a fresh interpreter with bytecode caching on"""
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    timings = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-c', IMPORT_PROBE.format(module)],
+            capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+        timings.append(float(completed.stdout.strip().splitlines()[-1]) * 1000)
+    return min(timings)
+
+def import_budget(argv):
+    """Measure what each command imports against its budget; exits 1 if any command is over"""
+    parser = argparse.ArgumentParser(prog='heymax.py import-budget',
+                                     description="Check the import time of every command against its budget")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    args = parser.parse_args(argv)
+
+    measured = {}
+    over = []
+    print(f"{'command':<12} {'module':<22} {'import':>9} {'budget':>8}")
+    for command, (_, module, _, budget) in COMMANDS.items():
+        if module not in measured:
+            measured[module] = measure_import_ms(module, args.runs)
+        elapsed = measured[module]
+        flag = '' if elapsed <= budget else '  OVER'
+        if flag:
+            over.append(command)
+        print(f"{command:<12} {module:<22} {elapsed:>7.1f}ms {budget:>6}ms{flag}")
+    if over:
+        print(f"{len(over)} command(s) over their import budget: {', '.join(over)}")
+        sys.exit(1)
+
+def main(argv=None):
+    commands = '\n'.join(f"  {name:<14}{entry[2]}" for name, entry in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        description="heymax merchant tools",
+        usage="%(prog)s COMMAND [ARGS...]",
+        epilog=f"commands:\n{commands}\n  {'import-budget':<14}Check each command's import time\n\n"
+               f"Run '%(prog)s COMMAND --help' for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('command', choices=[*COMMANDS, 'import-budget'], metavar='COMMAND')
+    parser.add_argument('args', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.command == 'import-budget':
+        import_budget(args.args)
+    else:
+        COMMANDS[args.command][0](args.args)
+
+if __name__ == "__main__":
+    main()
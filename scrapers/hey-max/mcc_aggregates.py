@@ -0,0 +1,214 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from datetime import datetime
+
+from merchant_store import canonical_mcc
+
+AGGREGATES_FILE = 'mcc_aggregates.json'
+FORMAT_VERSION = 1
+
+def input_digest(path, block_size=1 << 20):
+    """SHA-256 of a file's bytes; the store records it to say which merchant_data file it describes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _pair_hash(mcc, merchant_type):
+    digest = hashlib.blake2b(f"{mcc}\x1f{merchant_type}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def _ranked(counts):
+    """Counter items by descending count, ties broken by key so output is stable"""
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+class MccAggregates:
+    """
+    Merchant counts per (MCC, business type) pair, kept up to date from deltas.
+
+    Everything the metadata section and the MCC summary table report is derived
+    from these few hundred counters, so once the store exists, applying a crawl's
+    added/removed/changed merchants costs O(changes) and reading the tables costs
+    O(distinct pairs), independent of how many merchants there are.
+
+    `source` is the input_digest() of the merchant_data file the counters describe,
+    or None when that is unknown. A crawl diff carries the digests of the CSV it
+    started from and the CSV it wrote, so applying it moves the store along.
+    """
+
+    def __init__(self, pair_counts=None, applied=None, source=None):
+        self.pairs = Counter()
+        self.mcc_counts = Counter()
+        self.type_counts = Counter()
+        self.total = 0
+        self.applied = list(applied or [])
+        self.source = source
+        for (mcc, merchant_type), count in (pair_counts or {}).items():
+            self._adjust(mcc, merchant_type, count)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (store, mcc, type) rows"""
+        return cls(Counter((canonical_mcc(mcc), str(merchant_type)) for _, mcc, merchant_type in rows))
+
+    @classmethod
+    def from_frame(cls, merchant_data):
+        """Build from a process_merchant_data() frame with a single groupby"""
+        sizes = merchant_data.groupby(['MCC', 'Type'], sort=False, dropna=False, observed=True).size()
+        return cls({(canonical_mcc(mcc), str(merchant_type)): int(count)
+                    for (mcc, merchant_type), count in sizes.items()})
+
+    @classmethod
+    def from_csv(cls, csv_file):
+        """Build from a merchant_data CSV with Store, MCC and Type columns, one distinct row per merchant"""
+        with open(csv_file, 'r', newline='', encoding='utf-8') as file:
+            rows = {(row['Store'], canonical_mcc(row['MCC']), row['Type']) for row in csv.DictReader(file)}
+        return cls.from_rows(rows)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('version') != FORMAT_VERSION:
+            raise ValueError(f"{path} uses aggregate format {data.get('version')}, expected {FORMAT_VERSION}")
+        aggregates = cls({(mcc, merchant_type): count for mcc, merchant_type, count in data['pairs']},
+                         applied=data.get('applied'), source=data.get('source'))
+        if data.get('fingerprint', aggregates.fingerprint) != aggregates.fingerprint:
+            raise ValueError(f"{path} does not match its fingerprint; the file was edited or damaged")
+        return aggregates
+
+    def save(self, path):
+        data = {
+            'version': FORMAT_VERSION,
+            'updated': datetime.now().isoformat(),
+            'total': self.total,
+            'fingerprint': self.fingerprint,
+            'source': self.source,
+            'applied': self.applied,
+            'pairs': [[mcc, merchant_type, count] for (mcc, merchant_type), count in _ranked(self.pairs)]
+        }
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(data, file, indent=1, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def _adjust(self, mcc, merchant_type, delta):
+        key = (canonical_mcc(mcc), str(merchant_type))
+        if self.pairs[key] + delta < 0:
+            raise ValueError(f"Cannot remove merchant from MCC {key[0]} ({key[1]}): no merchants left there")
+        for counter, counter_key in ((self.pairs, key), (self.mcc_counts, key[0]), (self.type_counts, key[1])):
+            counter[counter_key] += delta
+            if not counter[counter_key]:
+                del counter[counter_key]
+        self.total += delta
+
+    def add(self, mcc, merchant_type):
+        self._adjust(mcc, merchant_type, 1)
+
+    def remove(self, mcc, merchant_type):
+        self._adjust(mcc, merchant_type, -1)
+
+    def apply_diff(self, report, name):
+        """Apply a merchant_diff report from fetch.py --incremental once; returns False if already applied"""
+        if name in self.applied:
+            return False
+        base = report.get('base')
+        if base and self.source and base != self.source:
+            raise ValueError(f"{name} was taken against a different merchant_data CSV than this store describes")
+        for entry in report.get('removed', []):
+            self.remove(entry['mcc'], entry['type'])
+        for entry in report.get('changed', []):
+            self.remove(entry['old_mcc'], entry['old_type'])
+            self.add(entry['new_mcc'], entry['new_type'])
+        for entry in report.get('added', []):
+            self.add(entry['mcc'], entry['type'])
+        self.applied.append(name)
+        # The store now describes the CSV the crawl wrote, if it described the one the crawl started from
+        rows = report.get('summary', {}).get('rows')
+        self.source = report.get('output') if base and base == self.source and rows == self.total else None
+        return True
+
+    def apply_diff_file(self, diff_file):
+        with open(diff_file, 'r', encoding='utf-8') as file:
+            return self.apply_diff(json.load(file), os.path.basename(diff_file))
+
+    @property
+    def fingerprint(self):
+        """
+        Order-independent hash of the merchants' (MCC, type) multiset.
+
+        save() writes it next to the counters and load() recomputes it, so a
+        hand-edited or damaged store is rejected instead of silently trusted.
+        """
+        total = sum(count * _pair_hash(mcc, merchant_type) for (mcc, merchant_type), count in self.pairs.items())
+        return f"{total % 2 ** 64:016x}"
+
+    @property
+    def unique_mccs(self):
+        return len(self.mcc_counts)
+
+    @property
+    def categories(self):
+        return len(self.type_counts)
+
+    def mcc_distribution(self):
+        return dict(_ranked(self.mcc_counts))
+
+    def category_distribution(self):
+        return dict(_ranked(self.type_counts))
+
+    def summary_rows(self):
+        """(mcc, type, count, percentage of all merchants) by descending count"""
+        return [(mcc, merchant_type, count, round(count / self.total * 100, 2))
+                for (mcc, merchant_type), count in _ranked(self.pairs)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the persistent MCC aggregate store")
+    parser.add_argument('--store', default=AGGREGATES_FILE, help=f"Aggregate file (default: {AGGREGATES_FILE})")
+    # --store is also accepted after the command, e.g. heymax.py stats --store other.json
+    store = argparse.ArgumentParser(add_help=False)
+    store.add_argument('--store', default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', parents=[store], help="Rebuild the store from a merchant_data CSV")
+    build.add_argument('csv')
+
+    apply = subparsers.add_parser('apply', parents=[store],
+                                  help="Apply merchant_diff reports from fetch.py --incremental")
+    apply.add_argument('diffs', nargs='+')
+
+    show = subparsers.add_parser('show', parents=[store], help="Print the largest MCC groups")
+    show.add_argument('--top', type=int, default=10)
+    show.add_argument('--csv', help="Count a merchant_data CSV directly instead of reading the store")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        aggregates = MccAggregates.from_csv(args.csv)
+        aggregates.source = input_digest(args.csv)
+        aggregates.save(args.store)
+        print(f"Wrote {aggregates.total} merchants in {len(aggregates.pairs)} MCC groups to {args.store}")
+    elif args.command == 'apply':
+        aggregates = MccAggregates.load(args.store)
+        start = time.perf_counter()
+        for diff_file in args.diffs:
+            if aggregates.apply_diff_file(diff_file):
+                print(f"Applied {diff_file}")
+            else:
+                print(f"Skipping {diff_file}, already applied")
+        elapsed = time.perf_counter() - start
+        aggregates.save(args.store)
+        print(f"{args.store}: {aggregates.total} merchants, updated in {elapsed * 1000:.2f} ms")
+    else:
+        aggregates = MccAggregates.from_csv(args.csv) if args.csv else MccAggregates.load(args.store)
+        print(f"{aggregates.total} merchants, {aggregates.unique_mccs} MCCs, {aggregates.categories} categories")
+        for mcc, merchant_type, count, percentage in aggregates.summary_rows()[:args.top]:
+            print(f"  {mcc}  {count:>6}  {percentage:>6.2f}%  {merchant_type}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import bisect
+import csv
+import re
+import time
+import unicodedata
+from collections import defaultdict, namedtuple
+
+from merchant_store import canonical_mcc
+
+MerchantMatch = namedtuple('MerchantMatch', ['store', 'mcc', 'type', 'score', 'match'])
+
+_NON_ALNUM = re.compile(r'[\W_]+')
+
+def normalize_name(name):
+    """Case- and punctuation-insensitive form of a merchant name: 'Trip.com' -> 'trip com'"""
+    name = unicodedata.normalize('NFKC', str(name)).casefold()
+    return _NON_ALNUM.sub(' ', name).strip()
+
+def compact_name(name):
+    """Normalized name without separators, so 'SP Services' and 'SPServices' meet"""
+    return normalize_name(name).replace(' ', '')
+
+def trigrams(text):
+    """Character trigrams of a compact name, padded so short names still get some"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class MerchantIndex:
+    """
+    In-memory merchant -> MCC index.
+
+    Exact lookups go through hash maps keyed by the normalized and compact
+    names. Prefix lookups bisect a sorted list of normalized names. Fuzzy
+    lookups score candidates from a trigram inverted index with the Dice
+    coefficient. Each kind of lookup touches only the entries it needs, not
+    the whole merchant list.
+    """
+
+    def __init__(self, records):
+        self.records = []
+        self.by_name = defaultdict(list)
+        self.by_compact = defaultdict(list)
+        self.postings = defaultdict(list)
+        self.gram_counts = []
+
+        for record in dict.fromkeys((str(store), canonical_mcc(mcc), str(merchant_type))
+                                    for store, mcc, merchant_type in records):
+            record_id = len(self.records)
+            self.records.append(record)
+            self.by_name[normalize_name(record[0])].append(record_id)
+            compact = compact_name(record[0])
+            self.by_compact[compact].append(record_id)
+            grams = trigrams(compact)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(record_id)
+
+        self.sorted_names = sorted(self.by_name)
+
+    @classmethod
+    def from_csv(cls, csv_file):
+        """Build from a merchant_data CSV with Store, MCC and Type columns"""
+        with open(csv_file, 'r', newline='', encoding='utf-8') as file:
+            return cls((row['Store'], row['MCC'], row['Type']) for row in csv.DictReader(file))
+
+    @classmethod
+    def from_snapshot(cls, snapshot_file):
+        """Build from a compact snapshot written by merchant_store.py"""
+        from merchant_store import MerchantSnapshot
+
+        with MerchantSnapshot(snapshot_file) as snapshot:
+            return cls(iter(snapshot))
+
+    @classmethod
+    def from_file(cls, path):
+        """Build from either a snapshot (.mcs) or a merchant_data CSV"""
+        return cls.from_snapshot(path) if path.endswith('.mcs') else cls.from_csv(path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def _matches(self, record_ids, score, match):
+        return [MerchantMatch(*self.records[record_id], score, match) for record_id in record_ids]
+
+    def lookup(self, name):
+        """Exact match on the normalized or compact name; returns every MCC the name is filed under"""
+        record_ids = self.by_name.get(normalize_name(name)) or self.by_compact.get(compact_name(name))
+        return self._matches(record_ids, 1.0, 'exact') if record_ids else []
+
+    def prefix(self, name, limit=10):
+        """Merchants whose normalized name starts with the given text"""
+        key = normalize_name(name)
+        if not key:
+            return []
+        matches = []
+        position = bisect.bisect_left(self.sorted_names, key)
+        while position < len(self.sorted_names) and len(matches) < limit:
+            candidate = self.sorted_names[position]
+            if not candidate.startswith(key):
+                break
+            matches.extend(self._matches(self.by_name[candidate], len(key) / len(candidate), 'prefix'))
+            position += 1
+        return matches[:limit]
+
+    def fuzzy(self, name, limit=5, min_score=0.4):
+        """Best trigram (Dice coefficient) matches at or above min_score"""
+        grams = trigrams(compact_name(name))
+        if not grams:
+            return []
+
+        shared = defaultdict(int)
+        for gram in grams:
+            for record_id in self.postings.get(gram, ()):
+                shared[record_id] += 1
+
+        scored = []
+        for record_id, common in shared.items():
+            score = 2 * common / (len(grams) + self.gram_counts[record_id])
+            if score >= min_score:
+                scored.append((score, record_id))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+
+        return [MerchantMatch(*self.records[record_id], round(score, 3), 'fuzzy')
+                for score, record_id in scored[:limit]]
+
+    def search(self, name, limit=5, min_score=0.4):
+        """Exact matches if there are any, otherwise prefix and fuzzy matches"""
+        matches = self.lookup(name)
+        if matches:
+            return matches[:limit]
+
+        seen = set()
+        results = []
+        for match in self.prefix(name, limit) + self.fuzzy(name, limit, min_score):
+            key = match[:3]
+            if key not in seen:
+                seen.add(key)
+                results.append(match)
+        results.sort(key=lambda match: -match.score)
+        return results[:limit]
+
+    def search_many(self, names, limit=1, min_score=0.4):
+        """Batch form of search(): {name: matches}"""
+        return {name: self.search(name, limit, min_score) for name in names}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up merchant MCC codes by name")
+    parser.add_argument('names', nargs='+', help="Merchant names to look up")
+    parser.add_argument('--csv', default='merchant_data_20241031_152616.csv',
+                        help="merchant_data CSV or .mcs snapshot to index")
+    parser.add_argument('--limit', type=int, default=3)
+    parser.add_argument('--min-score', type=float, default=0.4)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    index = MerchantIndex.from_file(args.csv)
+    print(f"Indexed {len(index)} merchants in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    results = index.search_many(args.names, args.limit, args.min_score)
+    elapsed = time.perf_counter() - start
+
+    for name, matches in results.items():
+        print(f"\n{name}:")
+        if not matches:
+            print("  no match")
+        for match in matches:
+            print(f"  {match.store} -> {match.mcc} ({match.type})  [{match.match} {match.score:.2f}]")
+    print(f"\n{len(args.names)} lookups in {elapsed * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,574 @@
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Frame, PageTemplate
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from mcc_aggregates import MccAggregates
+from process_merchants_mcc import create_mcc_summary, create_metadata_section, iter_search_optimized_content
+
+def register_unicode_font():
+    """
+    Register a Unicode-compatible font for PDF generation.
+    Returns True if successful, False if falling back to default font.
+    """
+    try:
+        # First try DejaVuSans if available (comes with many systems)
+        font_paths = [
+            # "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
+            "/Library/Fonts/Arial Unicode.ttf",  # MacOS
+            # "C:/Windows/Fonts/arial.ttf",  # Windows
+            # "DejaVuSans.ttf",  # Current directory
+            "Arial-Unicode-Regular.ttf"  # Current directory
+        ]
+
+        for font_path in font_paths:
+            if os.path.exists(font_path):
+                pdfmetrics.registerFont(TTFont('UniFont', font_path))
+                print(f"Successfully registered font: {font_path}")
+                return True
+
+        print("No Unicode font found, falling back to default font")
+        return False
+    except Exception as e:
+        print(f"Warning: Could not register Unicode font: {e}")
+        print("Falling back to built-in font - some characters may not display correctly")
+        return False
+
+def create_paragraph_cell(text, style):
+    """Create a paragraph cell for tables that will auto-wrap."""
+    return Paragraph(str(text), style)
+
+def wrap_text_in_table(data, col_widths, styles):
+    """Convert table data to use paragraphs for auto-wrapping."""
+    wrapped_data = []
+    for row in data:
+        wrapped_row = []
+        for idx, cell in enumerate(row):
+            # Convert to string and create paragraph for all cells except MCC (which is column 1)
+            if idx != 1:  # Not the MCC column
+                cell_str = str(cell)
+                wrapped_row.append(create_paragraph_cell(cell_str, styles['table_cell']))
+            else:
+                wrapped_row.append(cell)  # Keep MCC as is
+        wrapped_data.append(wrapped_row)
+    return wrapped_data
+
+# Rows per merchant listing table; each slice is laid out and released before the next is built
+TABLE_CHUNK_ROWS = 250
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+
+class StreamingDocTemplate(SimpleDocTemplate):
+    """
+    A SimpleDocTemplate that lays out flowables as they are produced.
+
+    doc.build(story) needs the whole story up front. build_streaming() pulls
+    flowables from an iterator and keeps only a small lookahead buffer, so the
+    Paragraphs for a page are released once that page has been drawn. The canvas
+    still keeps every finished page until the file is saved, so one document grows
+    with its page count; create_merchant_pdf_enhanced() keeps each one small by
+    rendering fragments.
+    """
+
+    def build_streaming(self, flowables, lookahead=64):
+        self._calc()
+        frame = Frame(self.leftMargin, self.bottomMargin, self.width, self.height, id='normal')
+        self.addPageTemplates([
+            PageTemplate(id='First', frames=frame, pagesize=self.pagesize),
+            PageTemplate(id='Later', frames=frame, pagesize=self.pagesize)
+        ])
+        self._startBuild()
+
+        canv = self.canv
+        canv._doctemplate = self
+        source = iter(flowables)
+        buffer = []
+        try:
+            while True:
+                # keepWithNext and table splitting look ahead, so never run the buffer dry
+                if len(buffer) < lookahead:
+                    buffer.extend(islice(source, lookahead - len(buffer)))
+                    if not buffer:
+                        break
+                self.clean_hanging()
+                self.handle_flowable(buffer)
+        finally:
+            del canv._doctemplate
+
+        self._endBuild()
+
+def create_pdf_styles(unicode_font_available):
+    """Create the paragraph styles used throughout the PDF."""
+    styles = getSampleStyleSheet()
+    font_name = 'UniFont' if unicode_font_available else 'Helvetica'
+
+    return {
+        'header': ParagraphStyle(
+            'CustomHeader',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            fontName=font_name
+        ),
+        'section': ParagraphStyle(
+            'SectionHeader',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=20,
+            fontName=font_name
+        ),
+        'subsection': ParagraphStyle(
+            'SubSectionHeader',
+            parent=styles['Heading3'],
+            fontSize=14,
+            spaceAfter=15,
+            fontName=font_name
+        ),
+        'normal': ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=12,
+            spaceAfter=12,
+            fontName=font_name
+        ),
+        'table_cell': ParagraphStyle(
+            'TableCell',
+            parent=styles['Normal'],
+            fontSize=10,
+            leading=12,
+            fontName=font_name
+        )
+    }
+
+def title_flowables(custom_styles):
+    """1. Title Page"""
+    yield Paragraph("Merchant Category Code (MCC)", custom_styles['header'])
+    yield Paragraph("Complete Reference Guide", custom_styles['header'])
+    yield Spacer(1, 50)
+    yield Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", custom_styles['normal'])
+    yield PageBreak()
+
+def toc_flowables(custom_styles):
+    """2. Table of Contents"""
+    yield Paragraph("Table of Contents", custom_styles['header'])
+    toc_items = [
+        "1. Document Metadata",
+        "2. MCC Code Summary",
+        "3. Complete Merchant Listing",
+        "4. Search Reference Guide",
+        "5. Merchant Variations",
+        "6. Question-Answer Reference"
+    ]
+    for item in toc_items:
+        yield Paragraph(item, custom_styles['normal'])
+    yield PageBreak()
+
+def metadata_flowables(merchant_data, custom_styles, aggregates=None):
+    """3. Metadata Section"""
+    yield Paragraph("1. Document Metadata", custom_styles['header'])
+    metadata = create_metadata_section(merchant_data, aggregates)
+    metadata_text = json.dumps(metadata, indent=2, ensure_ascii=False)
+    yield Paragraph(f"<pre>{metadata_text}</pre>", custom_styles['normal'])
+    yield PageBreak()
+
+def mcc_summary_flowables(merchant_data, custom_styles, aggregates=None):
+    """4. MCC Summary Section"""
+    yield Paragraph("2. MCC Code Summary", custom_styles['header'])
+    mcc_summary = create_mcc_summary(merchant_data, aggregates)
+
+    mcc_col_widths = [1*inch, 4*inch, 1*inch, 1*inch]
+    mcc_table_data = [['MCC', 'Business Type', 'Count', 'Percentage']] + list(zip(
+        mcc_summary['MCC'].astype(str).tolist(),
+        mcc_summary['Type'].astype(str).tolist(),
+        mcc_summary['count'].astype(str).tolist(),
+        (mcc_summary['percentage'].astype(str) + '%').tolist()
+    ))
+    wrapped_mcc_data = wrap_text_in_table(mcc_table_data, mcc_col_widths, custom_styles)
+    mcc_table = Table(wrapped_mcc_data, colWidths=mcc_col_widths, repeatRows=1)
+    mcc_table.setStyle(TABLE_STYLE)
+    yield mcc_table
+    yield PageBreak()
+
+def merchant_listing_flowables(merchant_data, custom_styles, heading=True):
+    """5. Main Merchant Listing, emitted as a series of table slices"""
+    if heading:
+        yield Paragraph("3. Complete Merchant Listing", custom_styles['header'])
+    main_col_widths = [2.5*inch, 1*inch, 3.5*inch]
+    for start in range(0, len(merchant_data), TABLE_CHUNK_ROWS):
+        rows = merchant_data.iloc[start:start + TABLE_CHUNK_ROWS].values.tolist()
+        main_data = [['Merchant Name', 'MCC', 'Business Type']] + rows
+        wrapped_main_data = wrap_text_in_table(main_data, main_col_widths, custom_styles)
+        main_table = Table(wrapped_main_data, colWidths=main_col_widths, repeatRows=1)
+        main_table.setStyle(TABLE_STYLE)
+        yield main_table
+    yield PageBreak()
+
+def search_guide_flowables(merchant_data, custom_styles, heading=True):
+    """6. Search Reference Guide"""
+    if heading:
+        yield Paragraph("4. Search Reference Guide", custom_styles['header'])
+    search_content = iter_search_optimized_content(merchant_data)
+
+    for i, entry in enumerate(search_content, 1):
+        if (i - 1) % GUIDE_ENTRIES_PER_PAGE == 0:  # Add page break every 3 entries
+            if i > 1:
+                yield PageBreak()
+
+        # Merchant header
+        yield Paragraph(f"Merchant: {entry['merchant_name']}", custom_styles['subsection'])
+
+        # Basic info
+        yield Paragraph(f"MCC: {entry['mcc_code']}", custom_styles['normal'])
+        yield Paragraph(f"Business Type: {entry['business_type']}", custom_styles['normal'])
+
+        # Search variations
+        yield Paragraph("Search Variations:", custom_styles['normal'])
+        for var in entry['merchant_name_variations']:
+            yield Paragraph(f"- {var}", custom_styles['normal'])
+
+        # QA pairs
+        yield Paragraph("Common Questions:", custom_styles['normal'])
+        for qa in entry['qa_pairs']:
+            yield Paragraph(f"Q: {qa['question']}", custom_styles['normal'])
+            yield Paragraph(f"A: {qa['answer']}", custom_styles['normal'])
+
+        yield Spacer(1, 20)
+
+def iter_merchant_pdf_flowables(merchant_data, custom_styles, aggregates=None):
+    """Yield every flowable of the reference guide, section by section."""
+    # Both summary sections read the same counters, so group the merchants at most once
+    aggregates = aggregates or MccAggregates.from_frame(merchant_data)
+    yield from title_flowables(custom_styles)
+    yield from toc_flowables(custom_styles)
+    yield from metadata_flowables(merchant_data, custom_styles, aggregates)
+    yield from mcc_summary_flowables(merchant_data, custom_styles, aggregates)
+    yield from merchant_listing_flowables(merchant_data, custom_styles)
+    yield from search_guide_flowables(merchant_data, custom_styles)
+
+def create_doc_template(output_file):
+    """Create the page template shared by the full document and its fragments."""
+    return StreamingDocTemplate(
+        output_file,
+        pagesize=letter,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72
+    )
+
+def create_merchant_pdf_enhanced(merchant_data, output_file, unicode_font_available, streaming=True, jobs=1,
+                                 cache_dir=None, aggregates=None):
+    """
+    Create a comprehensive PDF document with all information.
+
+    The streaming build renders bounded fragments one after another and merges
+    them, so its memory does not grow with the number of merchants. streaming=False
+    builds the whole story in one document, as the script originally did.
+    """
+    if streaming or jobs > 1 or cache_dir:
+        try:
+            create_merchant_pdf_fragments(merchant_data, output_file, unicode_font_available, jobs, cache_dir,
+                                          aggregates)
+            return
+        except ImportError:
+            print("pypdf is not installed, building the PDF as one document without fragments or the build cache")
+
+    doc = create_doc_template(output_file)
+
+    custom_styles = create_pdf_styles(unicode_font_available)
+    flowables = iter_merchant_pdf_flowables(merchant_data, custom_styles, aggregates)
+
+    # Build PDF
+    if streaming:
+        doc.build_streaming(flowables)
+    else:
+        doc.build(list(flowables))
+
+# Merchants per listing and search guide fragment. Each fragment is its own small
+# document, so ReportLab only ever holds one fragment's pages in memory, and fragments
+# can render in parallel or come from the cache. Every fragment starts on a new page
+# and groups its own guide entries GUIDE_ENTRIES_PER_PAGE to a page, so a boundary can
+# leave one partly filled page; in exchange the boundaries depend only on merchant names.
+LISTING_FRAGMENT_ROWS = 2000
+GUIDE_FRAGMENT_ROWS = 600
+GUIDE_ENTRIES_PER_PAGE = 3
+
+# Bump whenever the layout or content of the generated PDF changes, so cached fragments are rebuilt
+GENERATOR_VERSION = "5"
+
+def fingerprint_merchants(merchant_data):
+    """Hash the Store/MCC/Type rows in order, independent of pandas internals."""
+    rows = (merchant_data['Store'].astype(str) + '\x1f' + merchant_data['MCC'].astype(str)
+            + '\x1f' + merchant_data['Type'].astype(str))
+    return hashlib.sha256('\x1e'.join(rows.tolist()).encode('utf-8')).hexdigest()
+
+def name_hash(name):
+    """64-bit hash of a merchant name; unlike CRC-32, its residues stay uniform for names that share most bytes"""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def content_defined_ranges(names, average, minimum, maximum):
+    """
+    Cut rows into ranges at merchants whose name hash hits a target, not at fixed offsets.
+
+    Inserting or removing a merchant then only changes the range it lands in; the
+    boundaries after it stay put, so those fragments keep their cache keys. Past
+    `minimum` rows a name ends its range with probability 1 / (average - minimum),
+    so ranges hold `average` rows on average and never more than `maximum`.
+    """
+    ranges = []
+    start = 0
+    target = max(average - minimum, 1)
+    for index, name in enumerate(names):
+        size = index + 1 - start
+        if size >= maximum or (size >= minimum and name_hash(name) % target == 0):
+            ranges.append((start, index + 1))
+            start = index + 1
+    if start < len(names) or not ranges:
+        ranges.append((start, len(names)))
+    return ranges
+
+def plan_pdf_fragments(merchant_data, content_defined=False):
+    """Split the document into independently renderable (section, first row, last row) pieces."""
+    fragments = [('front', 0, len(merchant_data))]
+    names = merchant_data['Store'].astype(str).tolist()
+    for section, step in (('listing', LISTING_FRAGMENT_ROWS), ('guide', GUIDE_FRAGMENT_ROWS)):
+        if content_defined:
+            ranges = content_defined_ranges(names, step, step // 4, step * 4)
+        else:
+            ranges = [(start, min(start + step, len(names))) for start in range(0, max(len(names), 1), step)]
+        fragments.extend((section, start, stop) for start, stop in ranges)
+    return fragments
+
+def fragment_flowables(section, merchant_data, custom_styles, heading, aggregates=None):
+    """Flowables for one fragment; merchant_data is already sliced to the fragment's rows."""
+    if section == 'front':
+        yield from title_flowables(custom_styles)
+        yield from toc_flowables(custom_styles)
+        yield from metadata_flowables(merchant_data, custom_styles, aggregates)
+        yield from mcc_summary_flowables(merchant_data, custom_styles, aggregates)
+    elif section == 'listing':
+        yield from merchant_listing_flowables(merchant_data, custom_styles, heading=heading)
+    else:
+        yield from search_guide_flowables(merchant_data, custom_styles, heading=heading)
+
+def render_pdf_fragment(section, merchant_data, output_file, unicode_font_available, heading, aggregates=None):
+    """Render one fragment to its own PDF file (runs in a worker process)."""
+    if unicode_font_available and 'UniFont' not in pdfmetrics.getRegisteredFontNames():
+        register_unicode_font()
+    doc = create_doc_template(output_file)
+    custom_styles = create_pdf_styles(unicode_font_available)
+    doc.build_streaming(fragment_flowables(section, merchant_data, custom_styles, heading, aggregates))
+    return output_file
+
+def fragment_cache_key(section, merchant_data, unicode_font_available, heading):
+    """Cache key covering everything a listing or guide fragment's output depends on."""
+    parts = [GENERATOR_VERSION, section, str(unicode_font_available), str(heading),
+             fingerprint_merchants(merchant_data)]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+def load_build_manifest(cache_dir):
+    manifest_file = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def save_build_manifest(cache_dir, manifest):
+    manifest_file = os.path.join(cache_dir, 'manifest.json')
+    with open(manifest_file + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+# Object numbers the merged file reserves for its page tree and catalog
+MERGED_PAGES_OBJECT = 1
+MERGED_CATALOG_OBJECT = 2
+
+def _renumber(value, numbers, offsets, pending):
+    """Point every indirect reference in value at its object number in the merged file, queueing new objects."""
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    if isinstance(value, IndirectObject):
+        if value.idnum not in numbers:
+            numbers[value.idnum] = len(offsets)
+            offsets.append(None)
+            pending.append(value)
+        return IndirectObject(numbers[value.idnum], 0, None)
+    if isinstance(value, DictionaryObject):
+        for key, item in list(value.items()):
+            value[key] = _renumber(item, numbers, offsets, pending)
+    elif isinstance(value, ArrayObject):
+        value[:] = [_renumber(item, numbers, offsets, pending) for item in value]
+    return value
+
+def merge_pdf_fragments(fragment_files, output_file):
+    """
+    Concatenate fragment PDFs into output_file, one fragment at a time.
+
+    pypdf's PdfWriter holds every page of every input until it writes, so its
+    memory grows with the document. Here each fragment's pages and the objects
+    they reference are renumbered and written out before the next fragment is
+    opened; only an offset per object and a number per page are kept.
+    """
+    from pypdf import PdfReader
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+    offsets = [None, None, None]
+    page_numbers = []
+
+    with open(output_file, 'wb') as file:
+        def write_object(number, obj):
+            offsets[number] = file.tell()
+            file.write(f"{number} 0 obj\n".encode('ascii'))
+            obj.write_to_stream(file)
+            file.write(b"\nendobj\n")
+
+        file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for fragment_file in fragment_files:
+            reader = PdfReader(fragment_file)
+            numbers = {}
+            pending = []
+            pages = {page.indirect_reference.idnum for page in reader.pages}
+            page_numbers.extend(_renumber(page.indirect_reference, numbers, offsets, pending).idnum
+                                for page in reader.pages)
+            while pending:
+                reference = pending.pop()
+                obj = reference.get_object()
+                if reference.idnum in pages:
+                    # Pages hang off the merged page tree rather than their fragment's own
+                    del obj['/Parent']
+                    _renumber(obj, numbers, offsets, pending)
+                    obj[NameObject('/Parent')] = IndirectObject(MERGED_PAGES_OBJECT, 0, None)
+                else:
+                    _renumber(obj, numbers, offsets, pending)
+                write_object(numbers[reference.idnum], obj)
+            del reader
+
+        write_object(MERGED_PAGES_OBJECT, DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(IndirectObject(number, 0, None) for number in page_numbers),
+            NameObject('/Count'): NumberObject(len(page_numbers))
+        }))
+        write_object(MERGED_CATALOG_OBJECT, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(MERGED_PAGES_OBJECT, 0, None)
+        }))
+
+        xref_offset = file.tell()
+        file.write(f"xref\n0 {len(offsets)}\n0000000000 65535 f \n".encode('ascii'))
+        for offset in offsets[1:]:
+            file.write(f"{offset:010d} 00000 n \n".encode('ascii'))
+        file.write(f"trailer\n<< /Size {len(offsets)} /Root {MERGED_CATALOG_OBJECT} 0 R >>\n"
+                   f"startxref\n{xref_offset}\n%%EOF\n".encode('ascii'))
+
+def create_merchant_pdf_fragments(merchant_data, output_file, unicode_font_available, jobs=1, cache_dir=None,
+                                  aggregates=None):
+    """
+    Render the document as separate fragment PDFs and merge them in document order.
+
+    With jobs > 1 the fragments render in a process pool. With a cache_dir, the
+    whole build is skipped when the data is unchanged, and listing and guide
+    fragments whose rows are unchanged are reused from earlier builds. The front
+    matter carries the generation time, so it is always rendered again.
+    """
+    # Fail before rendering anything if the fragments could not be merged
+    if importlib.util.find_spec('pypdf') is None:
+        raise ImportError("No module named 'pypdf'")
+
+    build_key = '\x1f'.join([GENERATOR_VERSION, str(unicode_font_available), fingerprint_merchants(merchant_data)])
+    manifest = {}
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest = load_build_manifest(cache_dir)
+        if (manifest.get('build_key') == build_key
+                and manifest.get('output') == os.path.abspath(output_file)
+                and os.path.exists(output_file)
+                and os.path.getsize(output_file) == manifest.get('output_size')):
+            print(f"Merchant data unchanged since the last build, keeping {output_file}")
+            return
+
+    fragments = plan_pdf_fragments(merchant_data, content_defined=bool(cache_dir))
+    aggregates = aggregates or MccAggregates.from_frame(merchant_data)
+
+    with tempfile.TemporaryDirectory(prefix='merchant_pdf_') as fragment_dir:
+        fragment_files = []
+        tasks = []
+        rendered = []
+        cache_keys = []
+        for index, (section, start, stop) in enumerate(fragments):
+            # The front matter only reads the aggregates, so it does not ship the merchants to a worker
+            fragment_data = merchant_data.iloc[:0] if section == 'front' else merchant_data.iloc[start:stop]
+            heading = start == 0
+            fragment_file = os.path.join(fragment_dir, f"{index:05d}_{section}.pdf")
+            cached_file = None
+
+            if cache_dir and section != 'front':
+                key = fragment_cache_key(section, fragment_data, unicode_font_available, heading)
+                cache_keys.append(key)
+                cached_file = os.path.join(cache_dir, f"{key}.pdf")
+                if os.path.exists(cached_file):
+                    fragment_files.append(cached_file)
+                    continue
+
+            tasks.append((section, fragment_data, fragment_file, heading, cached_file))
+            rendered.append([section, start, stop])
+            fragment_files.append(cached_file or fragment_file)
+
+        print(f"Rendering {len(tasks)} of {len(fragments)} PDF fragments"
+              + (f" with {jobs} processes" if jobs > 1 else "") + "...")
+
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [
+                    executor.submit(render_pdf_fragment, section, fragment_data, fragment_file,
+                                    unicode_font_available, heading, aggregates)
+                    for section, fragment_data, fragment_file, heading, _ in tasks
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            for section, fragment_data, fragment_file, heading, _ in tasks:
+                render_pdf_fragment(section, fragment_data, fragment_file, unicode_font_available, heading,
+                                    aggregates)
+
+        # Only fully rendered fragments are moved into the cache
+        for _, _, fragment_file, _, cached_file in tasks:
+            if cached_file:
+                shutil.move(fragment_file, cached_file)
+
+        merge_pdf_fragments(fragment_files, output_file)
+
+    if cache_dir:
+        # Drop fragments the current document no longer uses so the cache does not grow without bound
+        current = {f"{key}.pdf" for key in cache_keys}
+        for name in os.listdir(cache_dir):
+            if name.endswith('.pdf') and name not in current:
+                os.remove(os.path.join(cache_dir, name))
+
+        save_build_manifest(cache_dir, {
+            'build_key': build_key,
+            'output': os.path.abspath(output_file),
+            'output_size': os.path.getsize(output_file),
+            'fragments': len(fragments),
+            'rendered': rendered
+        })
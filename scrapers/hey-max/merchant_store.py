@@ -0,0 +1,217 @@
+import argparse
+import csv
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+# Snapshot layout, all integers little-endian:
+#
+#   header        MAGIC, version u16, reserved u16, rows u32, types u32,
+#                 name bytes u32, type bytes u32
+#   mcc           u16[rows]              MCC as a number ('0742' -> 742)
+#   type_code     u16[rows]              index into the type dictionary
+#   (padding to a multiple of 4 bytes)
+#   name_offsets  u32[rows + 1]          start of each name in the name pool
+#   type_offsets  u32[types + 1]         start of each type in the type pool
+#   name pool     UTF-8 bytes
+#   type pool     UTF-8 bytes
+MAGIC = b'MCCSNAP\0'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHIIII')
+SNAPSHOT_SUFFIX = '.mcs'
+# Stored in the mcc column for a merchant without an MCC
+NO_MCC = 0xFFFF
+
+def canonical_mcc(mcc):
+    """The spelling every reader returns: four digits with leading zeros ('742 ' -> '0742'); blank stays ''"""
+    text = str(mcc).strip()
+    return text.zfill(4) if text.isascii() and text.isdigit() else text
+
+def _aligned(size, alignment=4):
+    return (size + alignment - 1) // alignment * alignment
+
+def write_snapshot(records, output_file):
+    """Write (store, mcc, type) records to a snapshot file; returns the row count"""
+    mccs = array('H')
+    type_codes = array('H')
+    name_offsets = array('I', [0])
+    names = bytearray()
+    types = {}
+
+    for row, (store, mcc, merchant_type) in enumerate(records, 1):
+        mcc = canonical_mcc(mcc)
+        if not mcc:
+            mccs.append(NO_MCC)
+        elif mcc.isascii() and mcc.isdigit() and int(mcc) < NO_MCC:
+            mccs.append(int(mcc))
+        else:
+            raise ValueError(f"Record {row} ({store!r}) has MCC {mcc!r}; snapshots hold numeric MCCs up to "
+                             f"{NO_MCC - 1} or a blank")
+        type_codes.append(types.setdefault(str(merchant_type), len(types)))
+        names += str(store).encode('utf-8')
+        name_offsets.append(len(names))
+
+    if len(types) > 0xFFFF:
+        raise ValueError(f"Too many distinct merchant types for a uint16 code: {len(types)}")
+
+    type_offsets = array('I', [0])
+    type_pool = bytearray()
+    for merchant_type in types:
+        type_pool += merchant_type.encode('utf-8')
+        type_offsets.append(len(type_pool))
+
+    if sys.byteorder != 'little':
+        for values in (mccs, type_codes, name_offsets, type_offsets):
+            values.byteswap()
+
+    with open(output_file, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(mccs), len(types), len(names), len(type_pool)))
+        file.write(mccs.tobytes())
+        file.write(type_codes.tobytes())
+        file.write(b'\0' * (_aligned(4 * len(mccs)) - 4 * len(mccs)))
+        file.write(name_offsets.tobytes())
+        file.write(type_offsets.tobytes())
+        file.write(names)
+        file.write(type_pool)
+
+    return len(mccs)
+
+def write_snapshot_from_csv(csv_file, output_file):
+    """Convert a merchant_data CSV (Store, MCC, Type columns) into a snapshot"""
+    with open(csv_file, 'r', newline='', encoding='utf-8') as file:
+        return write_snapshot(((row['Store'], row['MCC'], row['Type']) for row in csv.DictReader(file)),
+                              output_file)
+
+class MerchantSnapshot:
+    """
+    Read-only view of a snapshot file through mmap.
+
+    Opening only parses the header and the type dictionary. The MCC and type
+    code columns are memoryviews straight into the mapped file, and names are
+    decoded only when a row is read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        magic, version, _, rows, type_count, name_bytes, type_bytes = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a merchant snapshot")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} uses snapshot format {version}, expected {FORMAT_VERSION}")
+
+        offset = HEADER.size
+        mcc_start, offset = offset, offset + 2 * rows
+        code_start, offset = offset, offset + 2 * rows
+        offset = HEADER.size + _aligned(4 * rows)
+        name_offsets_start, offset = offset, offset + 4 * (rows + 1)
+        type_offsets_start, offset = offset, offset + 4 * (type_count + 1)
+        self._name_pool = offset
+        self._type_pool = offset + name_bytes
+
+        self.mccs = self._column(mcc_start, 2 * rows, 'H')
+        self.type_codes = self._column(code_start, 2 * rows, 'H')
+        self._name_offsets = self._column(name_offsets_start, 4 * (rows + 1), 'I')
+        type_offsets = self._column(type_offsets_start, 4 * (type_count + 1), 'I')
+
+        pool = self._view[self._type_pool:self._type_pool + type_bytes]
+        self.types = [bytes(pool[type_offsets[i]:type_offsets[i + 1]]).decode('utf-8')
+                      for i in range(type_count)]
+
+    def _column(self, start, size, typecode):
+        if sys.byteorder == 'little':
+            return self._view[start:start + size].cast(typecode)
+        # Big-endian hosts pay for one copy of the column
+        values = array(typecode, self._view[start:start + size])
+        values.byteswap()
+        return values
+
+    def __len__(self):
+        return len(self.mccs)
+
+    def store(self, index):
+        start = self._name_pool + self._name_offsets[index]
+        end = self._name_pool + self._name_offsets[index + 1]
+        return bytes(self._view[start:end]).decode('utf-8')
+
+    def mcc(self, index):
+        value = self.mccs[index]
+        return '' if value == NO_MCC else f"{value:04d}"
+
+    def type(self, index):
+        return self.types[self.type_codes[index]]
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.store(index), self.mcc(index), self.type(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_dataframe(self):
+        """Store/MCC/Type frame; MCC and Type are categorical, with MCCs spelled as mcc() returns them"""
+        import numpy as np
+        import pandas as pd
+
+        values, codes = np.unique(np.frombuffer(self.mccs, dtype=np.uint16), return_inverse=True)
+        mccs = ['' if value == NO_MCC else f"{value:04d}" for value in values.tolist()]
+        return pd.DataFrame({
+            'Store': [self.store(index) for index in range(len(self))],
+            'MCC': pd.Categorical.from_codes(codes, categories=mccs),
+            'Type': pd.Categorical.from_codes(np.frombuffer(self.type_codes, dtype=np.uint16), categories=self.types)
+        })
+
+    def close(self):
+        try:
+            for column in (self.mccs, self.type_codes, self._name_offsets):
+                if isinstance(column, memoryview):
+                    column.release()
+            self._view.release()
+            self._mmap.close()
+        except BufferError:
+            # A frame from to_dataframe() still shares the mapping; it is unmapped once that frame is gone
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect compact merchant snapshots")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help="Convert a merchant_data CSV into a snapshot")
+    build.add_argument('csv')
+    build.add_argument('output', nargs='?')
+
+    info = subparsers.add_parser('info', help="Summarise a snapshot")
+    info.add_argument('snapshot')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        output_file = args.output or args.csv.rsplit('.', 1)[0] + SNAPSHOT_SUFFIX
+        rows = write_snapshot_from_csv(args.csv, output_file)
+        print(f"Wrote {rows} merchants to {output_file}")
+    else:
+        start = time.perf_counter()
+        with MerchantSnapshot(args.snapshot) as snapshot:
+            elapsed = time.perf_counter() - start
+            print(f"{args.snapshot}: {len(snapshot)} merchants, {len(snapshot.types)} types, "
+                  f"opened in {elapsed * 1000:.2f} ms")
+            for index in range(min(5, len(snapshot))):
+                print("  " + " | ".join(snapshot[index]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import csv
+import html
+import json
+import random
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><title>{store} | HeyMax</title></head>
+<body>
+<main class="font-inter">
+{padding}<h1 class="font-inter text-[24px] font-semibold">{store}</h1>
+<span class="px-2 py-1 font-inter text-[12px] font-medium text-[#5046C5]">{mcc} ({merchant_type})</span>
+</main>
+</body>
+</html>
+"""
+
+# Stand-in for the navigation, cards and inline script data that surround the badge on a real page
+FILLER_BLOCK = ('<div class="flex flex-col gap-2 rounded-lg border border-gray-200 p-4">'
+                '<a class="text-[14px] text-gray-600" href="/merchant/other">Other merchant</a>'
+                '<p class="text-[12px] text-gray-400">Earn miles when you shop with this merchant.</p></div>\n')
+
+def synthetic_merchant_rows(count, seed=42):
+    """Deterministic (store, mcc, type) rows with random-looking names and 300 business types"""
+    rng = random.Random(seed)
+    types = [f"Business Category {i}" for i in range(300)]
+    rows = []
+    for i in range(count):
+        name = ' '.join(
+            ''.join(rng.choices(string.ascii_letters, k=rng.randint(3, 10)))
+            for _ in range(rng.randint(1, 3))
+        )
+        mcc_index = rng.randrange(len(types))
+        rows.append((f"{name} {i}", str(4000 + mcc_index), types[mcc_index]))
+    return rows
+
+def index_merchants(rows):
+    """Key (store, mcc, type) rows by lowercased store name"""
+    return {store.lower(): (store, mcc, merchant_type) for store, mcc, merchant_type in rows}
+
+def load_merchants(csv_file):
+    """Read Store/MCC/Type rows from a merchant_data CSV, keyed by lowercased store name"""
+    with open(csv_file, newline='', encoding='utf-8') as file:
+        return index_merchants((row['Store'], row['MCC'], row['Type']) for row in csv.DictReader(file))
+
+class MockHeymaxHandler(BaseHTTPRequestHandler):
+    """Serve merchant pages and the all_merchants API the way heymax.ai does"""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        merchants = self.server.merchants
+        delay, fail = self.server.next_response()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self._send(503, 'text/plain', b'Service unavailable')
+            return
+
+        if self.path.rstrip('/') == '/api/all_merchants':
+            body = json.dumps([store for store, _, _ in merchants.values()]).encode('utf-8')
+            self._send(200, 'application/json', body)
+            return
+
+        if self.path.startswith('/merchant/'):
+            name = unquote(self.path[len('/merchant/'):])
+            merchant = merchants.get(name.lower())
+            if merchant:
+                store, mcc, merchant_type = merchant
+                body = PAGE_TEMPLATE.format(
+                    store=html.escape(store),
+                    padding=self.server.padding,
+                    mcc=html.escape(mcc),
+                    merchant_type=html.escape(merchant_type)
+                ).encode('utf-8')
+                self._send(200, 'text/html; charset=utf-8', body)
+                return
+
+        self._send(404, 'text/plain', b'Not found')
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MockHeymaxServer(ThreadingHTTPServer):
+    """
+    Threaded stub server with tunable response behaviour.
+
+    Every request waits `latency` seconds plus up to `jitter` more, and fails
+    with a 503 with probability `failure_rate`. Pages carry `page_kb` of filler
+    markup ahead of the badge so parsers do realistic work. Delays and failures
+    come from one seeded generator, so a single-worker run is reproducible.
+    """
+
+    # Concurrent crawlers open many sockets at once; the default backlog of 5 drops SYNs
+    request_queue_size = 128
+    daemon_threads = True
+
+    def configure(self, merchants, latency=0.0, jitter=0.0, failure_rate=0.0, page_kb=0, seed=0):
+        self.merchants = merchants
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.padding = FILLER_BLOCK * (page_kb * 1024 // len(FILLER_BLOCK))
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def next_response(self):
+        """(seconds to wait, whether to fail) for the next request"""
+        with self.rng_lock:
+            delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.failure_rate > 0 and self.rng.random() < self.failure_rate
+        return delay, fail
+
+def create_server(csv_file=None, host='127.0.0.1', port=0, merchants=None, **behaviour):
+    """Create (but do not start) a stub server serving `merchants` or else csv_file; port 0 picks a free port"""
+    server = MockHeymaxServer((host, port), MockHeymaxHandler)
+    server.configure(merchants if merchants is not None else load_merchants(csv_file), **behaviour)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for heymax.ai merchant pages")
+    parser.add_argument('--csv', default='merchant_data_20241031_152616.csv',
+                        help="merchant_data CSV to serve")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--synthetic', type=int, metavar='COUNT',
+                        help="Serve COUNT generated merchants instead of the CSV")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Fixed delay before every response")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Extra random delay of up to this much")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Fraction of requests answered with 503 (default: 0)")
+    parser.add_argument('--page-kb', type=int, default=0, help="Filler markup per merchant page, in KB")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for latency jitter and failures")
+    args = parser.parse_args()
+
+    merchants = index_merchants(synthetic_merchant_rows(args.synthetic)) if args.synthetic else None
+    server = create_server(
+        args.csv, args.host, args.port, merchants=merchants,
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        failure_rate=args.failure_rate, page_kb=args.page_kb, seed=args.seed
+    )
+    host, port = server.server_address[:2]
+    print(f"Serving {len(server.merchants)} merchants on http://{host}:{port}/merchant/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+
+from fetch import (
+    ALIASES_FILE,
+    CHECKPOINT_FILE,
+    DEFAULT_BASE_URL,
+    FAILURE_LEDGER_FILE,
+    canonical_store_name,
+    fetch_merchant_data,
+    setup_logging,
+    store_key,
+)
+from mcc_aggregates import AGGREGATES_FILE, MccAggregates, input_digest
+from merchant_store import canonical_mcc
+from process_merchants_mcc import iter_merchant_chunks, sort_merchants
+
+# Rows allowed to queue up between two stages before the upstream stage waits
+DEFAULT_QUEUE_SIZE = 256
+# Most rows the export stage turns into chunks in one go, and how long it waits to fill a batch.
+# Per-batch DataFrame overhead dwarfs per-row work, so trickling rows are gathered for a moment.
+EXPORT_BATCH_ROWS = 500
+EXPORT_LINGER_S = 0.25
+
+class StageStats:
+    """Counts and timings of one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.dropped = 0
+        self.busy = 0.0
+        self.first_output = None
+        self.finished = None
+        self.exit_code = 0
+        self.failed = False
+
+    def output(self, started):
+        self.items += 1
+        if self.first_output is None:
+            self.first_output = time.perf_counter() - started
+
+    def summary(self, started):
+        return {
+            'stage': self.name,
+            'items': self.items,
+            'dropped': self.dropped,
+            'busy_s': round(self.busy, 2),
+            'first_output_s': round(self.first_output, 2) if self.first_output is not None else None,
+            'finished_s': round(self.finished - started, 2) if self.finished else None,
+            'exit_code': self.exit_code
+        }
+
+class PipelineAborted(Exception):
+    """Raised into the crawler through its row sink once a later stage has failed"""
+
+def stage_failed(stats, abort):
+    """Record a stage's exception and tell every other stage to stop"""
+    logging.exception(f"{stats.name.capitalize()} stage failed, stopping the pipeline")
+    stats.exit_code = 1
+    stats.failed = True
+    abort.set()
+
+def crawl_stage(outbox, stats, started, abort, engine, crawl_options):
+    """Run the crawler and hand every CSV row downstream as soon as it is written"""
+    def sink(row):
+        if abort.is_set():
+            raise PipelineAborted("a later pipeline stage failed")
+        stats.output(started)
+        outbox.put(row)
+
+    try:
+        if engine == 'async':
+            from async_fetch import fetch_merchant_data_async
+            fetch_merchant_data_async(row_sink=sink, **crawl_options)
+        else:
+            fetch_merchant_data(row_sink=sink, **crawl_options)
+    except SystemExit as e:
+        # The crawler exits non-zero when some stores failed; the rows it did get still flow on
+        stats.exit_code = e.code
+    except PipelineAborted:
+        logging.error("Crawl stopped because a later pipeline stage failed")
+        stats.exit_code = 1
+    except Exception:
+        stage_failed(stats, abort)
+    finally:
+        stats.finished = time.perf_counter()
+        stats.busy = stats.finished - started
+        outbox.put(None)
+
+# Every later stage reads its inbox through iter(inbox.get, None). If the stage fails or
+# the pipeline is aborted, its finally block keeps reading that iterator until the end
+# marker (a no-op if it was already reached), so the stage before it never blocks on a
+# full queue, and then passes the end marker on.
+
+def normalize_stage(inbox, outbox, stats, started, abort):
+    """Canonicalize store names and drop rows already seen, like process_merchant_data()'s drop_duplicates"""
+    seen = set()
+    rows = iter(inbox.get, None)
+    try:
+        for row in rows:
+            if abort.is_set():
+                break
+            start = time.perf_counter()
+            store = canonical_store_name(row[0])
+            mcc = canonical_mcc(row[1])
+            merchant_type = str(row[2]).strip()
+            key = (store_key(store), mcc, merchant_type)
+            if key in seen:
+                stats.dropped += 1
+                stats.busy += time.perf_counter() - start
+                continue
+            seen.add(key)
+            stats.busy += time.perf_counter() - start
+            stats.output(started)
+            outbox.put((store, mcc, merchant_type))
+    except Exception:
+        stage_failed(stats, abort)
+    finally:
+        for _ in rows:
+            pass
+        stats.finished = time.perf_counter()
+        outbox.put(None)
+
+def aggregate_stage(inbox, outbox, stats, started, abort, aggregates, aggregates_file, save_interval):
+    """Fold each merchant into the MCC aggregates, saving them every save_interval seconds"""
+    last_save = time.perf_counter()
+    rows = iter(inbox.get, None)
+    try:
+        for row in rows:
+            if abort.is_set():
+                break
+            start = time.perf_counter()
+            aggregates.add(row[1], row[2])
+            if start - last_save >= save_interval:
+                aggregates.save(aggregates_file)
+                last_save = time.perf_counter()
+            stats.busy += time.perf_counter() - start
+            stats.output(started)
+            outbox.put(row)
+
+        if not abort.is_set():
+            start = time.perf_counter()
+            aggregates.save(aggregates_file)
+            stats.busy += time.perf_counter() - start
+    except Exception:
+        stage_failed(stats, abort)
+    finally:
+        for _ in rows:
+            pass
+        stats.finished = time.perf_counter()
+        outbox.put(None)
+
+def export_stage(inbox, stats, started, abort, output_file, collected):
+    """Append merchant RAG chunks to a JSONL file, flushing after every batch so readers can follow along"""
+    done = False
+    # Shared across batches so a merchant name repeated in a later batch still gets a distinct chunk ID
+    seen = Counter()
+    try:
+        with open(output_file, 'w', encoding='utf-8') as file:
+            while not done and not abort.is_set():
+                # Block for one row, then keep collecting until the batch is full or the linger time is up
+                batch = []
+                row = inbox.get()
+                deadline = time.perf_counter() + EXPORT_LINGER_S
+                while row is not None:
+                    batch.append(row)
+                    remaining = deadline - time.perf_counter()
+                    if len(batch) >= EXPORT_BATCH_ROWS or remaining <= 0:
+                        break
+                    try:
+                        row = inbox.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                done = row is None
+
+                if batch:
+                    start = time.perf_counter()
+                    for chunk in iter_merchant_chunks(pd.DataFrame(batch, columns=['Store', 'MCC', 'Type']), seen):
+                        file.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+                        stats.output(started)
+                    file.flush()
+                    collected.extend(batch)
+                    stats.busy += time.perf_counter() - start
+    except Exception:
+        stage_failed(stats, abort)
+    finally:
+        if not done:
+            for _ in iter(inbox.get, None):
+                pass
+        stats.finished = time.perf_counter()
+
+def build_pdf(rows, output_file, aggregates, jobs, cache_dir):
+    """Render the reference PDF once the stream is complete"""
+    from merchant_pdf import create_merchant_pdf_enhanced, register_unicode_font
+
+    merchant_data = sort_merchants(pd.DataFrame(rows, columns=['Store', 'MCC', 'Type']))
+    create_merchant_pdf_enhanced(merchant_data, output_file, register_unicode_font(),
+                                 jobs=jobs, cache_dir=cache_dir, aggregates=aggregates)
+
+def run_pipeline(engine='threads', crawl_options=None, output_dir='.', queue_size=DEFAULT_QUEUE_SIZE,
+                 save_interval=5.0, pdf=None, jobs=1, cache_dir=None, aggregates_file=AGGREGATES_FILE):
+    """
+    Crawl, normalize, aggregate and export in one pass, each stage on its own thread.
+
+    The crawl yields every merchant of the store list, not changes to an earlier
+    crawl, so the persistent aggregate store is rebuilt from the stream rather than
+    added to. Once the crawl's CSV is complete the store records its digest, and
+    process_merchants_mcc.py reuses the store as is for that CSV.
+    """
+    log_filename = setup_logging()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(output_dir, exist_ok=True)
+    export_file = os.path.join(output_dir, f'merchant_rag_merchant_{timestamp}.jsonl')
+    report_file = os.path.join(output_dir, f'merchant_pipeline_{timestamp}.json')
+    csv_file = f'merchant_data_{timestamp}.csv'
+
+    crawled, normalized, aggregated = (queue.Queue(maxsize=queue_size) for _ in range(3))
+    stats = [StageStats(name) for name in ('crawl', 'normalize', 'aggregate', 'export')]
+    aggregates = MccAggregates()
+    collected = []
+    abort = threading.Event()
+    started = time.perf_counter()
+
+    threads = [
+        threading.Thread(target=crawl_stage, name='crawl',
+                         args=(crawled, stats[0], started, abort, engine,
+                               {**(crawl_options or {}), 'csv_filename': csv_file})),
+        threading.Thread(target=normalize_stage, name='normalize',
+                         args=(crawled, normalized, stats[1], started, abort)),
+        threading.Thread(target=aggregate_stage, name='aggregate',
+                         args=(normalized, aggregated, stats[2], started, abort, aggregates, aggregates_file,
+                               save_interval)),
+        threading.Thread(target=export_stage, name='export',
+                         args=(aggregated, stats[3], started, abort, export_file, collected)),
+    ]
+    logging.info(f"Streaming crawl results to {export_file} and {aggregates_file}")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    # Every CSV row went through the aggregates; unless normalize dropped one, they describe that file
+    if not abort.is_set() and not stats[1].dropped and os.path.exists(csv_file):
+        aggregates.source = input_digest(csv_file)
+        aggregates.save(aggregates_file)
+
+    report = {
+        'elapsed_s': round(elapsed, 2),
+        'queue_size': queue_size,
+        'aborted': abort.is_set(),
+        'stages': [stage.summary(started) for stage in stats],
+        'outputs': {'csv': csv_file, 'jsonl': export_file, 'aggregates': aggregates_file}
+    }
+
+    logging.info(f"\nPipeline finished in {elapsed:.2f}s")
+    logging.info(f"  {'stage':<10} {'items':>7} {'dropped':>8} {'busy':>8} {'first out':>10} {'done at':>8}")
+    for summary in report['stages']:
+        first_output = f"{summary['first_output_s']:.2f}s" if summary['first_output_s'] is not None else '-'
+        logging.info(f"  {summary['stage']:<10} {summary['items']:>7} {summary['dropped']:>8} "
+                     f"{summary['busy_s']:>7.2f}s {first_output:>10} {summary['finished_s'] or 0:>7.2f}s")
+    logging.info(f"{aggregates.total} merchants in {len(aggregates.pairs)} MCC groups")
+    if abort.is_set():
+        failed = ', '.join(stage.name for stage in stats if stage.failed)
+        logging.error(f"Pipeline aborted after the {failed} stage failed; its outputs are incomplete")
+
+    if pdf and collected and not abort.is_set():
+        start = time.perf_counter()
+        build_pdf(collected, pdf, aggregates, jobs, cache_dir)
+        report['outputs']['pdf'] = pdf
+        report['pdf_s'] = round(time.perf_counter() - start, 2)
+        logging.info(f"PDF document created in {report['pdf_s']}s: {pdf}")
+
+    with open(report_file, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2)
+    logging.info(f"Pipeline report saved to {report_file}")
+    logging.info(f"Logs have been saved to {log_filename}")
+    return report
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Crawl merchants and stream them straight into the aggregates and the RAG export"
+    )
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads')
+    parser.add_argument('--workers', type=int, default=4, help="Fetch workers with --engine threads (default: 4)")
+    parser.add_argument('--concurrency', type=int, default=16, help="Open requests with --engine async")
+    parser.add_argument('--rate', type=float, default=10.0,
+                        help="Requests per second per host with --engine async, 0 for no limit (default: 10)")
+    parser.add_argument('--stores', default='stores.json')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    parser.add_argument('--aliases', default=ALIASES_FILE)
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--retry-backoff', type=float, default=2.0)
+    parser.add_argument('--output-dir', default='.', help="Where the JSONL and the report go")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Rows buffered between stages (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument('--aggregates', default=AGGREGATES_FILE,
+                        help=f"Persistent MCC aggregate store to rebuild from the crawl (default: {AGGREGATES_FILE})")
+    parser.add_argument('--save-interval', type=float, default=5.0,
+                        help="Seconds between saves of the partial aggregates (default: 5)")
+    parser.add_argument('--pdf', help="Also build the reference PDF here once the crawl is done")
+    parser.add_argument('--jobs', type=int, default=1, help="PDF render processes")
+    parser.add_argument('--cache-dir', help="PDF fragment cache directory")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    crawl_options = {
+        'stores_file': args.stores,
+        'base_url': args.base_url,
+        'checkpoint_file': CHECKPOINT_FILE,
+        'failure_file': FAILURE_LEDGER_FILE,
+        'resume': args.resume,
+        'max_retries': args.max_retries,
+        'retry_backoff': args.retry_backoff,
+        'aliases_file': args.aliases
+    }
+    if args.engine == 'async':
+        crawl_options.update(concurrency=args.concurrency, rate=args.rate, burst=max(1, int(args.rate)))
+    else:
+        crawl_options['workers'] = args.workers
+
+    report = run_pipeline(args.engine, crawl_options, args.output_dir, args.queue_size, args.save_interval,
+                          args.pdf, args.jobs, args.cache_dir, args.aggregates)
+    exit_code = next((stage['exit_code'] for stage in report['stages'] if stage['exit_code']), 0)
+    if exit_code:
+        raise SystemExit(exit_code)
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,183 @@
 import pandas as pd
+import argparse
+import codecs
+import csv
+import hashlib
+import heapq
 import os  # Add this import at the top
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+import tempfile
 import json
+from collections import Counter
 from datetime import datetime
+from itertools import islice
 from textwrap import wrap
-
-def register_unicode_font():
-    """
-    Register a Unicode-compatible font for PDF generation.
-    Returns True if successful, False if falling back to default font.
+from fetch import store_key
+from merchant_store import MerchantSnapshot, SNAPSHOT_SUFFIX, canonical_mcc
+from mcc_aggregates import AGGREGATES_FILE, MccAggregates, input_digest
+
+INGEST_CHUNK_ROWS = 50000
+DEFAULT_MEMORY_BUDGET_MB = 256
+# Rough per-row cost of a (store, mcc, type) tuple held in a list and a set, excluding the text itself
+ROW_OVERHEAD_BYTES = 300
+# Fragment cache of merchant_pdf.create_merchant_pdf_fragments(), kept between builds
+PDF_CACHE_DIR = ".pdf_build_cache"
+
+def detect_csv_encoding(input_file, block_size=1 << 20):
+    """Decide between UTF-8 and GB18030 in one pass over the raw bytes, without parsing the CSV."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(input_file, 'rb') as file:
+        first = file.read(block_size)
+        encoding = 'utf-8-sig' if first.startswith(codecs.BOM_UTF8) else 'utf-8'
+        block = first
+        try:
+            while block:
+                decoder.decode(block)
+                block = file.read(block_size)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return 'gb18030'
+    return encoding
+
+def canonical_mcc_column(mccs):
+    """canonical_mcc() over a column, computed once per distinct value."""
+    mccs = mccs.astype(object).fillna('').astype(str)
+    return mccs.map({mcc: canonical_mcc(mcc) for mcc in mccs.unique()})
+
+def iter_merchant_csv_chunks(input_file, encoding, chunk_rows=INGEST_CHUNK_ROWS):
+    """Yield lists of (Store, MCC, Type) tuples, chunk_rows at a time; blanks stay empty strings."""
+    # object dtype keeps values as plain Python str, which is much faster to iterate than Arrow-backed strings
+    reader = pd.read_csv(input_file, encoding=encoding, usecols=['Store', 'MCC', 'Type'], dtype=object,
+                         keep_default_na=False, chunksize=chunk_rows)
+    for chunk in reader:
+        chunk = chunk.drop_duplicates()
+        yield list(zip(chunk['Store'], canonical_mcc_column(chunk['MCC']), chunk['Type']))
+
+def merchant_sort_key(row):
+    """Listing order of a (Store, MCC, Type) row: store name ignoring case, ties broken by the row itself."""
+    return row[0].casefold(), row
+
+def sort_merchants(merchant_data):
+    """Order a merchant frame by store name ignoring case, so 'eBay' files under E rather than after 'Z'."""
+    return merchant_data.sort_values('Store', key=lambda names: names.astype(str).str.casefold())
+
+def write_sorted_run(rows, directory):
+    """Sort one in-memory run and spill it to a temporary CSV; returns the file path."""
+    rows.sort(key=merchant_sort_key)
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=directory)
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8') as file:
+        csv.writer(file).writerows(rows)
+    return path
+
+def iter_sorted_unique_rows(input_file, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, chunk_rows=INGEST_CHUNK_ROWS):
     """
-    try:
-        # First try DejaVuSans if available (comes with many systems)
-        font_paths = [
-            # "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
-            "/Library/Fonts/Arial Unicode.ttf",  # MacOS
-            # "C:/Windows/Fonts/arial.ttf",  # Windows
-            # "DejaVuSans.ttf",  # Current directory
-            "Arial-Unicode-Regular.ttf"  # Current directory
-        ]
+    Yield the distinct (Store, MCC, Type) rows of a merchant CSV in sorted order.
 
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                pdfmetrics.registerFont(TTFont('UniFont', font_path))
-                print(f"Successfully registered font: {font_path}")
-                return True
-
-        print("No Unicode font found, falling back to default font")
-        return False
-    except Exception as e:
-        print(f"Warning: Could not register Unicode font: {e}")
-        print("Falling back to built-in font - some characters may not display correctly")
-        return False
+    Rows are deduplicated with a hash set while they fit in the memory budget.
+    Past the budget each set is sorted and spilled to disk as a run, and the
+    runs are k-way merged, dropping duplicates that landed in different runs.
+    """
+    encoding = detect_csv_encoding(input_file)
+    budget = memory_budget_mb * 1024 * 1024
+    seen = set()
+    used = 0
+    runs = []
+
+    with tempfile.TemporaryDirectory(prefix='merchant_runs_') as run_dir:
+        for chunk in iter_merchant_csv_chunks(input_file, encoding, chunk_rows):
+            for row in chunk:
+                if row in seen:
+                    continue
+                seen.add(row)
+                used += ROW_OVERHEAD_BYTES + len(row[0]) + len(row[1]) + len(row[2])
+                if used >= budget:
+                    runs.append(write_sorted_run(list(seen), run_dir))
+                    seen.clear()
+                    used = 0
+
+        if not runs:
+            yield from sorted(seen, key=merchant_sort_key)
+            return
+
+        if seen:
+            runs.append(write_sorted_run(list(seen), run_dir))
+            seen.clear()
+        print(f"Merging {len(runs)} sorted runs from {input_file} ({encoding})")
+
+        files = [open(path, newline='', encoding='utf-8') for path in runs]
+        try:
+            previous = None
+            for row in heapq.merge(*(map(tuple, csv.reader(file)) for file in files), key=merchant_sort_key):
+                if row != previous:
+                    yield row
+                    previous = row
+        finally:
+            for file in files:
+                file.close()
+
+def process_merchant_data_chunked(input_file, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """Bounded-memory counterpart of process_merchant_data() for merchant dumps larger than RAM."""
+    rows = iter_sorted_unique_rows(input_file, memory_budget_mb)
+    # Only the distinct rows are materialised, chunk by chunk
+    frames = [pd.DataFrame(batch, columns=['Store', 'MCC', 'Type'])
+              for batch in iter(lambda: list(islice(rows, INGEST_CHUNK_ROWS)), [])]
+    if not frames:
+        return pd.DataFrame(columns=['Store', 'MCC', 'Type'])
+    return pd.concat(frames, ignore_index=True)
+
+def process_merchant_data(input_file, chunked=False, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB):
+    """Read and process the merchant data CSV file (or .mcs snapshot) with Unicode support."""
+    if chunked and not input_file.endswith(SNAPSHOT_SUFFIX):
+        try:
+            return process_merchant_data_chunked(input_file, memory_budget_mb)
+        except Exception as e:
+            print(f"Error processing data: {e}")
+            return None
 
-def process_merchant_data(input_file):
-    """Read and process the merchant data CSV file with Unicode support."""
     try:
-        # Try UTF-8 first
-        df = pd.read_csv(input_file, encoding='utf-8')
+        if input_file.endswith(SNAPSHOT_SUFFIX):
+            with MerchantSnapshot(input_file) as snapshot:
+                df = snapshot.to_dataframe()
+            df['Type'] = df['Type'].astype(str)
+        else:
+            # Try UTF-8 first
+            df = pd.read_csv(input_file, encoding='utf-8', dtype={'MCC': str})
     except UnicodeDecodeError:
         try:
             # Try alternative encoding if UTF-8 fails
-            df = pd.read_csv(input_file, encoding='gb18030')
+            df = pd.read_csv(input_file, encoding='gb18030', dtype={'MCC': str})
         except Exception as e:
             print(f"Error processing file with alternative encoding: {e}")
             return None
 
     try:
         # Clean and prepare data
-        df = df[['Store', 'MCC', 'Type']].drop_duplicates()
-        df = df.sort_values('Store')
+        df = df[['Store', 'MCC', 'Type']].copy()
+        # Convert MCC to string and ensure it's formatted correctly, before deduplicating
+        # so that '742 ' and '0742' count as the same merchant
+        df['MCC'] = canonical_mcc_column(df['MCC'])
+        df = df.drop_duplicates()
+        df = sort_merchants(df)
         df = df.fillna('')  # Replace NaN with empty string
 
-        # Convert MCC to string and ensure it's formatted correctly
-        df['MCC'] = df['MCC'].astype(str).str.strip()
-
         return df
     except Exception as e:
         print(f"Error processing data: {e}")
         return None
 
-def create_metadata_section(merchant_data):
+def create_metadata_section(merchant_data, aggregates=None):
     """Create metadata about the dataset for RAG context."""
+    aggregates = aggregates or MccAggregates.from_frame(merchant_data)
     metadata = {
         "document_type": "Merchant Reference Guide",
-        "total_merchants": len(merchant_data),
-        "unique_mccs": len(merchant_data['MCC'].unique()),
-        "mcc_categories": len(merchant_data['Type'].unique()),
+        "total_merchants": aggregates.total,
+        "unique_mccs": aggregates.unique_mccs,
+        "mcc_categories": aggregates.categories,
         "generation_date": datetime.now().strftime("%Y-%m-%d"),
         "data_source": "merchant_transactions",
         "version": "1.0",
         "last_updated": datetime.now().isoformat(),
-        "category_distribution": merchant_data['Type'].value_counts().to_dict(),
-        "mcc_distribution": merchant_data['MCC'].value_counts().to_dict(),
+        "category_distribution": aggregates.category_distribution(),
+        "mcc_distribution": aggregates.mcc_distribution(),
         "data_fields": {
             "merchant_name": "Business name as appears in transactions",
             "mcc": "Merchant Category Code - standardized industry classification",
@@ -87,42 +186,93 @@ def create_metadata_section(merchant_data):
     }
     return metadata
 
-def create_mcc_summary(merchant_data):
+def create_mcc_summary(merchant_data, aggregates=None):
     """Create a summary of MCC codes and their meanings."""
-    mcc_summary = merchant_data.groupby(['MCC', 'Type']).size().reset_index()
-    mcc_summary = mcc_summary.rename(columns={0: 'count'})
-    mcc_summary = mcc_summary.sort_values('count', ascending=False)
-
-    # Add percentage of total
-    total_merchants = len(merchant_data)
-    mcc_summary['percentage'] = (mcc_summary['count'] / total_merchants * 100).round(2)
-
-    return mcc_summary
+    aggregates = aggregates or MccAggregates.from_frame(merchant_data)
+    return pd.DataFrame(aggregates.summary_rows(), columns=['MCC', 'Type', 'count', 'percentage'])
 
-def create_search_optimized_content(merchant_data):
-    """Create alternative search-friendly merchant listings."""
-    search_content = []
+def load_mcc_aggregates(aggregates_file, merchant_data, diff_files=(), source=None):
+    """
+    Load the persistent MCC aggregates and apply new crawl diffs to them.
 
-    for _, row in merchant_data.iterrows():
-        # Create variations and patterns for each merchant
-        merchant_name = str(row['Store'])
-        mcc_code = str(row['MCC'])
-        business_type = str(row['Type'])
+    source is the input_digest() of the file merchant_data was read from. A store
+    that describes that file is used as it is, without grouping the merchants;
+    any other store is rebuilt from merchant_data.
+    """
+    diff_names = [os.path.basename(diff_file) for diff_file in diff_files]
+    if os.path.exists(aggregates_file):
+        try:
+            aggregates = MccAggregates.load(aggregates_file)
+            applied = [diff_file for diff_file in diff_files if aggregates.apply_diff_file(diff_file)]
+        except ValueError as e:
+            print(f"Could not update {aggregates_file}: {e}")
+        else:
+            for diff_file in applied:
+                print(f"Applied {diff_file} to {aggregates_file}")
+            if source is not None and aggregates.source == source:
+                if applied:
+                    aggregates.save(aggregates_file)
+                return aggregates
+            print(f"{aggregates_file} was not built from this input")
+
+    print(f"Rebuilding {aggregates_file} from the merchant data")
+    # The input already reflects these diffs, so they must not be applied again later
+    aggregates = MccAggregates.from_frame(merchant_data)
+    aggregates.source = source
+    aggregates.applied = diff_names
+    aggregates.save(aggregates_file)
+    return aggregates
+
+# Rows turned into search entries per batch of column operations
+SEARCH_CONTENT_CHUNK_ROWS = 10000
+
+def _search_content_records(chunk):
+    """Build search entries for a slice of merchants with column-wise string operations."""
+    names = chunk['Store'].astype(str).astype(object)
+    mcc_codes = chunk['MCC'].astype(str).astype(object)
+    business_types = chunk['Type'].astype(str).astype(object)
+
+    names_lower = names.str.lower()
+    search_keys = names + " " + mcc_codes + " " + business_types
+    search_keys_normalized = names_lower + " " + mcc_codes + " " + business_types.str.lower()
+
+    has_unicode = names.str.contains(r'[^\x00-\x7f]', regex=True)
+    # Outside ASCII str.isdigit() also accepts characters such as superscripts, so check those names one by one
+    contains_numbers = names.str.contains(r'[0-9]', regex=True)
+    if has_unicode.any():
+        contains_numbers[has_unicode] = names[has_unicode].map(lambda name: any(c.isdigit() for c in name))
+
+    columns = zip(
+        names.tolist(),
+        names_lower.tolist(),
+        names.str.upper().tolist(),
+        names.str.replace(" ", "", regex=False).tolist(),
+        names.str.replace(" ", "_", regex=False).tolist(),
+        mcc_codes.tolist(),
+        business_types.tolist(),
+        search_keys.tolist(),
+        search_keys_normalized.tolist(),
+        has_unicode.tolist(),
+        names.str.len().tolist(),
+        contains_numbers.tolist()
+    )
 
-        entry = {
+    for (merchant_name, name_lower, name_upper, name_no_spaces, name_underscored, mcc_code, business_type,
+         search_key, search_key_normalized, name_has_unicode, name_length, name_contains_numbers) in columns:
+        yield {
             "merchant_name": merchant_name,
-            "merchant_name_lower": merchant_name.lower(),
+            "merchant_name_lower": name_lower,
             "merchant_name_variations": [
                 merchant_name,
-                merchant_name.lower(),
-                merchant_name.upper(),
-                merchant_name.replace(" ", ""),
-                merchant_name.replace(" ", "_"),
+                name_lower,
+                name_upper,
+                name_no_spaces,
+                name_underscored,
             ],
             "mcc_code": mcc_code,
             "business_type": business_type,
-            "search_key": f"{merchant_name} {mcc_code} {business_type}",
-            "search_key_normalized": f"{merchant_name.lower()} {mcc_code} {business_type.lower()}",
+            "search_key": search_key,
+            "search_key_normalized": search_key_normalized,
             "qa_pairs": [
                 {
                     "question": f"What is the MCC for {merchant_name}?",
@@ -138,214 +288,205 @@ def create_search_optimized_content(merchant_data):
                 }
             ],
             "metadata": {
-                "has_unicode": any(ord(c) > 127 for c in merchant_name),
-                "name_length": len(merchant_name),
-                "contains_numbers": any(c.isdigit() for c in merchant_name)
+                "has_unicode": name_has_unicode,
+                "name_length": name_length,
+                "contains_numbers": name_contains_numbers
             }
         }
-        search_content.append(entry)
-
-    return search_content
-
-def create_paragraph_cell(text, style):
-    """Create a paragraph cell for tables that will auto-wrap."""
-    return Paragraph(str(text), style)
-
-def wrap_text_in_table(data, col_widths, styles):
-    """Convert table data to use paragraphs for auto-wrapping."""
-    wrapped_data = []
-    for row in data:
-        wrapped_row = []
-        for idx, cell in enumerate(row):
-            # Convert to string and create paragraph for all cells except MCC (which is column 1)
-            if idx != 1:  # Not the MCC column
-                cell_str = str(cell)
-                wrapped_row.append(create_paragraph_cell(cell_str, styles['table_cell']))
-            else:
-                wrapped_row.append(cell)  # Keep MCC as is
-        wrapped_data.append(wrapped_row)
-    return wrapped_data
-
-def create_merchant_pdf_enhanced(merchant_data, output_file, unicode_font_available):
-    """Create a comprehensive PDF document with all information."""
-    doc = SimpleDocTemplate(
-        output_file,
-        pagesize=letter,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=72
-    )
 
-    story = []
-    styles = getSampleStyleSheet()
-
-    # Create custom styles
-    custom_styles = {
-        'header': ParagraphStyle(
-            'CustomHeader',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-            fontName='UniFont' if unicode_font_available else 'Helvetica'
-        ),
-        'section': ParagraphStyle(
-            'SectionHeader',
-            parent=styles['Heading2'],
-            fontSize=16,
-            spaceAfter=20,
-            fontName='UniFont' if unicode_font_available else 'Helvetica'
-        ),
-        'subsection': ParagraphStyle(
-            'SubSectionHeader',
-            parent=styles['Heading3'],
-            fontSize=14,
-            spaceAfter=15,
-            fontName='UniFont' if unicode_font_available else 'Helvetica'
-        ),
-        'normal': ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=12,
-            spaceAfter=12,
-            fontName='UniFont' if unicode_font_available else 'Helvetica'
-        ),
-        'table_cell': ParagraphStyle(
-            'TableCell',
-            parent=styles['Normal'],
-            fontSize=10,
-            leading=12,
-            fontName='UniFont' if unicode_font_available else 'Helvetica'
-        )
-    }
+def iter_search_optimized_content(merchant_data):
+    """Yield search-friendly merchant entries, computed a chunk of rows at a time."""
+    for start in range(0, len(merchant_data), SEARCH_CONTENT_CHUNK_ROWS):
+        yield from _search_content_records(merchant_data.iloc[start:start + SEARCH_CONTENT_CHUNK_ROWS])
 
-    # 1. Title Page
-    story.append(Paragraph("Merchant Category Code (MCC)", custom_styles['header']))
-    story.append(Paragraph("Complete Reference Guide", custom_styles['header']))
-    story.append(Spacer(1, 50))
-    story.append(Paragraph(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", custom_styles['normal']))
-    story.append(PageBreak())
-
-    # 2. Table of Contents
-    story.append(Paragraph("Table of Contents", custom_styles['header']))
-    toc_items = [
-        "1. Document Metadata",
-        "2. MCC Code Summary",
-        "3. Complete Merchant Listing",
-        "4. Search Reference Guide",
-        "5. Merchant Variations",
-        "6. Question-Answer Reference"
-    ]
-    for item in toc_items:
-        story.append(Paragraph(item, custom_styles['normal']))
-    story.append(PageBreak())
-
-    # 3. Metadata Section
-    story.append(Paragraph("1. Document Metadata", custom_styles['header']))
-    metadata = create_metadata_section(merchant_data)
-    metadata_text = json.dumps(metadata, indent=2, ensure_ascii=False)
-    story.append(Paragraph(f"<pre>{metadata_text}</pre>", custom_styles['normal']))
-    story.append(PageBreak())
-
-    # 4. MCC Summary Section
-    story.append(Paragraph("2. MCC Code Summary", custom_styles['header']))
-    mcc_summary = create_mcc_summary(merchant_data)
-
-    mcc_col_widths = [1*inch, 4*inch, 1*inch, 1*inch]
-    mcc_table_data = [['MCC', 'Business Type', 'Count', 'Percentage']] + [
-        [str(row['MCC']),
-         str(row['Type']),
-         str(row['count']),
-         f"{row['percentage']}%"]
-        for _, row in mcc_summary.iterrows()
-    ]
-    wrapped_mcc_data = wrap_text_in_table(mcc_table_data, mcc_col_widths, custom_styles)
-    mcc_table = Table(wrapped_mcc_data, colWidths=mcc_col_widths, repeatRows=1)
-    mcc_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    story.append(mcc_table)
-    story.append(PageBreak())
-
-    # 5. Main Merchant Listing
-    story.append(Paragraph("3. Complete Merchant Listing", custom_styles['header']))
-    main_col_widths = [2.5*inch, 1*inch, 3.5*inch]
-    main_data = [['Merchant Name', 'MCC', 'Business Type']] + merchant_data.values.tolist()
-    wrapped_main_data = wrap_text_in_table(main_data, main_col_widths, custom_styles)
-    main_table = Table(wrapped_main_data, colWidths=main_col_widths, repeatRows=1)
-    main_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    story.append(main_table)
-    story.append(PageBreak())
-
-    # 6. Search Reference Guide
-    story.append(Paragraph("4. Search Reference Guide", custom_styles['header']))
-    search_content = create_search_optimized_content(merchant_data)
-
-    for i, entry in enumerate(search_content, 1):
-        if i % 3 == 1:  # Add page break every 3 entries
-            if i > 1:
-                story.append(PageBreak())
-
-        # Merchant header
-        story.append(Paragraph(f"Merchant: {entry['merchant_name']}", custom_styles['subsection']))
-
-        # Basic info
-        story.append(Paragraph(f"MCC: {entry['mcc_code']}", custom_styles['normal']))
-        story.append(Paragraph(f"Business Type: {entry['business_type']}", custom_styles['normal']))
-
-        # Search variations
-        story.append(Paragraph("Search Variations:", custom_styles['normal']))
-        for var in entry['merchant_name_variations']:
-            story.append(Paragraph(f"- {var}", custom_styles['normal']))
-
-        # QA pairs
-        story.append(Paragraph("Common Questions:", custom_styles['normal']))
-        for qa in entry['qa_pairs']:
-            story.append(Paragraph(f"Q: {qa['question']}", custom_styles['normal']))
-            story.append(Paragraph(f"A: {qa['answer']}", custom_styles['normal']))
+def create_search_optimized_content(merchant_data):
+    """Create alternative search-friendly merchant listings."""
+    return list(iter_search_optimized_content(merchant_data))
+
+# Merchants listed per MCC group chunk, so large groups stay within embedding limits
+MCC_GROUP_CHUNK_MERCHANTS = 100
+
+def stable_chunk_id(prefix, *parts):
+    """Derive an ID that stays the same across builds for the same content key."""
+    digest = hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f"{prefix}-{digest[:16]}"
+
+def iter_merchant_chunks(merchant_data, seen=None):
+    """
+    Yield one retrieval chunk per merchant.
 
-        story.append(Spacer(1, 20))
+    IDs are keyed on the merchant name alone, so a merchant whose MCC changes
+    keeps its ID and an upsert replaces the stale chunk. Further rows for a name
+    already seen get a numbered suffix; pass the same seen Counter when the
+    merchants arrive in several frames.
+    """
+    seen = Counter() if seen is None else seen
+    for entry in iter_search_optimized_content(merchant_data):
+        key = store_key(entry['merchant_name'])
+        seen[key] += 1
+        chunk_id = stable_chunk_id("merchant", key, *([seen[key]] if seen[key] > 1 else []))
+        lines = [
+            f"Merchant: {entry['merchant_name']}",
+            f"MCC: {entry['mcc_code']}",
+            f"Business Type: {entry['business_type']}",
+            "Search Variations: " + ", ".join(dict.fromkeys(entry['merchant_name_variations']))
+        ]
+        for qa in entry['qa_pairs']:
+            lines.append(f"Q: {qa['question']}")
+            lines.append(f"A: {qa['answer']}")
 
-    # Build PDF
-    doc.build(story)
+        yield {
+            "id": chunk_id,
+            "granularity": "merchant",
+            "text": "\n".join(lines),
+            "metadata": {
+                "merchant_name": entry['merchant_name'],
+                "mcc_code": entry['mcc_code'],
+                "business_type": entry['business_type'],
+                **entry['metadata']
+            }
+        }
 
+def iter_mcc_group_chunks(merchant_data):
+    """Yield chunks listing the merchants under each MCC and business type."""
+    for (mcc_code, business_type), group in merchant_data.groupby(['MCC', 'Type'], sort=True):
+        names = group['Store'].astype(str).tolist()
+        parts = range(0, len(names), MCC_GROUP_CHUNK_MERCHANTS)
+        for part, start in enumerate(parts):
+            members = names[start:start + MCC_GROUP_CHUNK_MERCHANTS]
+            text = "\n".join([
+                f"MCC {mcc_code}: {business_type}",
+                f"{len(names)} merchants use MCC {mcc_code} ({business_type}).",
+                "Merchants: " + ", ".join(members)
+            ])
+            yield {
+                "id": stable_chunk_id("mcc", mcc_code, business_type, part),
+                "granularity": "mcc",
+                "text": text,
+                "metadata": {
+                    "mcc_code": str(mcc_code),
+                    "business_type": str(business_type),
+                    "merchant_count": len(names),
+                    "part": part + 1,
+                    "parts": len(parts)
+                }
+            }
 
-def main():
+def iter_rag_chunks(merchant_data, granularity):
+    """Yield RAG chunks at 'merchant' or 'mcc' granularity."""
+    if granularity == 'mcc':
+        return iter_mcc_group_chunks(merchant_data)
+    return iter_merchant_chunks(merchant_data)
+
+def export_rag_jsonl(merchant_data, output_file, granularity='merchant'):
+    """Write one JSON chunk per line, ready for bulk embedding."""
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as file:
+        for chunk in iter_rag_chunks(merchant_data, granularity):
+            file.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+def export_rag_parquet(merchant_data, output_file, granularity='merchant'):
+    """Write the same chunks as a Parquet table (needs pyarrow or fastparquet)."""
+    chunks = pd.DataFrame(
+        [
+            {**chunk, "metadata": json.dumps(chunk['metadata'], ensure_ascii=False)}
+            for chunk in iter_rag_chunks(merchant_data, granularity)
+        ],
+        columns=['id', 'granularity', 'text', 'metadata']
+    )
+    chunks.to_parquet(output_file, index=False)
+    return len(chunks)
+
+def export_rag_formats(merchant_data, formats, granularities, output_dir='.', aggregates=None):
+    """Write every requested format/granularity pair plus the dataset metadata."""
+    os.makedirs(output_dir, exist_ok=True)
+    exporters = {'jsonl': export_rag_jsonl, 'parquet': export_rag_parquet}
+
+    for granularity in granularities:
+        for export_format in formats:
+            output_file = os.path.join(output_dir, f"merchant_rag_{granularity}.{export_format}")
+            try:
+                count = exporters[export_format](merchant_data, output_file, granularity)
+            except ImportError as e:
+                print(f"Skipping {output_file}: {e}")
+                continue
+            print(f"Exported {count} {granularity} chunks to {output_file}")
+
+    metadata_file = os.path.join(output_dir, "merchant_rag_metadata.json")
+    with open(metadata_file, 'w', encoding='utf-8') as file:
+        json.dump(create_metadata_section(merchant_data, aggregates), file, indent=2, ensure_ascii=False, default=str)
+    print(f"Exported dataset metadata to {metadata_file}")
+
+
+def parse_args(argv=None):
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Build the merchant MCC reference PDF")
+    parser.add_argument('--input', default="merchant_data_20241031_152616.csv",
+                        help="merchant_data CSV produced by fetch.py, or a .mcs snapshot of one")
+    parser.add_argument('--output', default="merchant_mcc_reference_complete.pdf",
+                        help="PDF file to write")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Render PDF sections in this many processes and merge them (needs pypdf)")
+    parser.add_argument('--cache-dir', default=PDF_CACHE_DIR,
+                        help=f"Where unchanged PDF fragments are kept between builds (default: {PDF_CACHE_DIR})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Always rebuild the whole PDF")
+    parser.add_argument('--export', nargs='+', choices=['jsonl', 'parquet'], default=[],
+                        help="Also write RAG chunks in these formats")
+    parser.add_argument('--export-granularity', nargs='+', choices=['merchant', 'mcc'], default=['merchant'],
+                        help="One chunk per merchant and/or per MCC group (default: merchant)")
+    parser.add_argument('--export-dir', default='.',
+                        help="Directory for exported chunks (default: current directory)")
+    parser.add_argument('--chunked', action='store_true',
+                        help="Stream the CSV in chunks and spill to sorted runs on disk past --memory-budget-mb")
+    parser.add_argument('--memory-budget-mb', type=int, default=DEFAULT_MEMORY_BUDGET_MB,
+                        help=f"Memory for deduplicating rows before spilling with --chunked "
+                             f"(default: {DEFAULT_MEMORY_BUDGET_MB})")
+    parser.add_argument('--aggregates', default=AGGREGATES_FILE,
+                        help=f"Persistent MCC aggregate store behind the summary sections (default: {AGGREGATES_FILE})")
+    parser.add_argument('--apply-diff', nargs='+', default=[], metavar='DIFF',
+                        help="merchant_diff JSON from fetch.py --incremental to fold into the aggregates")
+    parser.add_argument('--skip-pdf', action='store_true',
+                        help="Only write the exports, not the PDF")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Main function to process data and create PDF."""
-    input_file = "merchant_data_20241031_152616.csv"
-    output_pdf = "merchant_mcc_reference_complete.pdf"
+    args = parse_args(argv)
+    input_file = args.input
+    output_pdf = args.output
 
     try:
-        # Register Unicode font
-        unicode_font_available = register_unicode_font()
-
         # Process merchant data
         print("Processing merchant data...")
-        merchant_data = process_merchant_data(input_file)
+        merchant_data = process_merchant_data(input_file, args.chunked, args.memory_budget_mb)
 
         if merchant_data is not None:
-            # Create enhanced PDF
-            print("Creating comprehensive PDF document...")
-            create_merchant_pdf_enhanced(merchant_data, output_pdf, unicode_font_available)
-            print(f"PDF document created successfully: {output_pdf}")
+            aggregates = load_mcc_aggregates(args.aggregates, merchant_data, args.apply_diff,
+                                             input_digest(input_file))
+
+            if args.export:
+                print("Exporting RAG chunks...")
+                export_rag_formats(merchant_data, args.export, args.export_granularity, args.export_dir,
+                                   aggregates)
+
+            if not args.skip_pdf:
+                # ReportLab is only loaded when a PDF is actually built
+                from merchant_pdf import create_merchant_pdf_enhanced, register_unicode_font
+
+                unicode_font_available = register_unicode_font()
+
+                # Create enhanced PDF
+                print("Creating comprehensive PDF document...")
+                create_merchant_pdf_enhanced(
+                    merchant_data, output_pdf, unicode_font_available,
+                    jobs=args.jobs,
+                    cache_dir=None if args.no_cache else args.cache_dir,
+                    aggregates=aggregates
+                )
+                print(f"PDF document created successfully: {output_pdf}")
 
     except Exception as e:
         print(f"Error in main process: {e}")